@@ -4,11 +4,17 @@ Main entry point for the web application
 """
 from flask import Flask, render_template, request, jsonify, redirect, url_for
 from flask_cors import CORS
+from jinja2 import FileSystemBytecodeCache
 from config import get_config
 from models import db
 from datetime import datetime
 import os
 
+try:
+    from flask_compress import Compress  # Optional: gzip/brotli response compression
+except ImportError:
+    Compress = None
+
 def create_app(config_name=None):
     """Application factory pattern"""
     app = Flask(__name__)
@@ -20,18 +26,33 @@ def create_app(config_name=None):
     config_class = get_config()
     app.config.from_object(config_class)
 
+    # Use orjson for jsonify()/request.get_json() when it is installed
+    from utils import ORJSONProvider, orjson
+    if orjson is not None:
+        app.json = ORJSONProvider(app)
+
     # Initialize extensions
     db.init_app(app)
     CORS(app)
+    if Compress is not None:
+        Compress(app)
 
     # Create necessary directories
     os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
     os.makedirs(app.config['STATIC_FOLDER'], exist_ok=True)
     os.makedirs(app.config['TEMPLATE_FOLDER'], exist_ok=True)
+    os.makedirs(app.config['TEMPLATE_CACHE_FOLDER'], exist_ok=True)
+
+    # Load compiled templates from disk instead of parsing them on first render
+    app.jinja_env.bytecode_cache = FileSystemBytecodeCache(str(app.config['TEMPLATE_CACHE_FOLDER']))
 
     # Create database tables
     with app.app_context():
         db.create_all()
+        # create_all() skips existing tables, so add any indexes they are missing
+        for table in db.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(db.engine, checkfirst=True)
 
     # Register blueprints
     from routes.api import api_bp
@@ -55,8 +76,11 @@ def create_app(config_name=None):
         return render_template('500.html'), 500
     
     # Register template filters
-    from utils import convert_utc_to_local
-    
+    from utils import convert_utc_to_local, get_local_timezone
+
+    # Resolved once here so the filter does not go through current_app per value
+    local_tz = get_local_timezone(app)
+
     @app.template_filter('local_time')
     def local_time_filter(dt, format='%Y-%m-%d %H:%M:%S'):
         """
@@ -66,7 +90,7 @@ def create_app(config_name=None):
             {{ record.timestamp | local_time }}
             {{ record.timestamp | local_time('%I:%M %p') }}
         """
-        local_dt = convert_utc_to_local(dt)
+        local_dt = convert_utc_to_local(dt, local_tz)
         if local_dt is None:
             return 'N/A'
         return local_dt.strftime(format)
@@ -83,5 +107,6 @@ if __name__ == '__main__':
     app.run(
         host=app.config['HOST'],
         port=app.config['PORT'],
-        debug=app.config['DEBUG']
+        debug=app.config['DEBUG'],
+        threaded=True  # An open MJPEG stream holds its thread; other requests get their own
     )
@@ -2,6 +2,12 @@
 Configuration management for Face Attendance System
 """
 import os
+# Keep BLAS/OpenMP pools from oversubscribing the Pi's cores. These are read
+# once when numpy loads, so they are set here: app.py imports config before
+# anything that imports numpy (models, database, recognition_service).
+os.environ.setdefault('OMP_NUM_THREADS', '1')
+os.environ.setdefault('OPENBLAS_NUM_THREADS', '1')
+
 import pytz
 from pathlib import Path
 from dotenv import load_dotenv
@@ -25,22 +31,56 @@ class Config:
     DATABASE_URL = os.getenv('DATABASE_URL', f'sqlite:///{BASE_DIR}/attendance.db')
     SQLALCHEMY_DATABASE_URI = DATABASE_URL
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    SQLALCHEMY_ECHO = False
+
+    # Connection pool, sized to the request threads (see gunicorn --threads in
+    # the README) so a long-lived video stream never starves API requests.
+    # File-backed SQLite uses a QueuePool too; only in-memory SQLite is exempt.
+    DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 16))
+    DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', 16))
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'pool_pre_ping': True,   # Drop connections killed by DB restarts/NAT timeouts
+        'pool_recycle': 1800,
+    }
+    if ':memory:' not in DATABASE_URL:
+        SQLALCHEMY_ENGINE_OPTIONS.update(
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+        )
+
+    # Response compression for JSON/HTML (used when Flask-Compress is installed);
+    # multipart MJPEG streams are not in its mimetype list and pass through
+    COMPRESS_ALGORITHM = ['br', 'gzip']
+    COMPRESS_MIN_SIZE = 500
+    COMPRESS_LEVEL = 4     # gzip
+    COMPRESS_BR_LEVEL = 4  # brotli
 
     # Camera Configuration
     CAMERA_WIDTH = int(os.getenv('CAMERA_WIDTH', 640))
     CAMERA_HEIGHT = int(os.getenv('CAMERA_HEIGHT', 480))
     CAMERA_FPS = int(os.getenv('CAMERA_FPS', 30))
+    JPEG_QUALITY = int(os.getenv('JPEG_QUALITY', 85))  # MJPEG stream frames
 
     # Face Recognition Configuration
     DETECTION_SIZE = int(os.getenv('DETECTION_SIZE', 320))
     RECOGNITION_THRESHOLD = float(os.getenv('RECOGNITION_THRESHOLD', 20))
     PROCESS_EVERY_N_FRAMES = int(os.getenv('PROCESS_EVERY_N_FRAMES', 2))
 
+    # Gallery search (FAISS is optional; NumPy is used below these sizes)
+    FAISS_MIN_GALLERY = int(os.getenv('FAISS_MIN_GALLERY', 256))
+    FAISS_IVF_MIN_GALLERY = int(os.getenv('FAISS_IVF_MIN_GALLERY', 1000))
+    FAISS_IVF_NPROBE = int(os.getenv('FAISS_IVF_NPROBE', 8))
+
     # InsightFace Configuration
     INSIGHTFACE_MODEL = 'buffalo_l'
     INSIGHTFACE_DET_SIZE = (DETECTION_SIZE, DETECTION_SIZE)
     EXECUTION_PROVIDER = 'CPUExecutionProvider'
 
+    # Thread budget (Pi has 4 cores: capture, 2x ONNX Runtime, JPEG encode)
+    ORT_INTRA_OP_THREADS = int(os.getenv('ORT_INTRA_OP_THREADS', 2))
+    ORT_INTER_OP_THREADS = int(os.getenv('ORT_INTER_OP_THREADS', 1))
+    CV_NUM_THREADS = int(os.getenv('CV_NUM_THREADS', 1))
+
     # Dataset Configuration
     DATASET_PATH = BASE_DIR / 'insightface_dataset'
     ENCODINGS_FILE = BASE_DIR / 'insightface_encodings.pkl'
@@ -65,6 +105,8 @@ class Config:
     # Static and Template Folders
     STATIC_FOLDER = BASE_DIR / 'static'
     TEMPLATE_FOLDER = BASE_DIR / 'templates'
+    # Compiled template bytecode, reused across restarts
+    TEMPLATE_CACHE_FOLDER = Path(os.getenv('TEMPLATE_CACHE_FOLDER', BASE_DIR / '.jinja_cache'))
 
     # Upload Configuration
     UPLOAD_FOLDER = BASE_DIR / 'uploads'
@@ -86,6 +128,7 @@ class TestingConfig(Config):
     DEBUG = True
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    SQLALCHEMY_ENGINE_OPTIONS = {}
 
 # Configuration dictionary
 config = {
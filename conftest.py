@@ -0,0 +1,48 @@
+"""
+Shared pytest fixtures: a fresh app on an in-memory database for each test
+"""
+import os
+
+import pytest
+
+os.environ['FLASK_ENV'] = 'testing'
+
+import database  # noqa: E402
+import routes.api  # noqa: E402
+import routes.web  # noqa: E402
+from app import create_app  # noqa: E402
+from database import DatabaseManager  # noqa: E402
+from models import db  # noqa: E402
+
+
+def reset_process_caches():
+    """Drop the module-level caches, which outlive one app's in-memory database"""
+    DatabaseManager.invalidate_active_session()
+    database._student_ref_cache.clear()
+    database._settings_cache['settings'] = None
+    routes.api._student_json_cache.clear()
+    routes.api._cached_status.cache_clear()
+    routes.api._cached_status_etag.cache_clear()
+    routes.web.invalidate_dashboard_cache()
+
+
+@pytest.fixture
+def app():
+    """Application on an empty in-memory database, with an app context pushed"""
+    reset_process_caches()
+    app = create_app()
+
+    # Requests share the pushed app context below, so hand each one a fresh
+    # session as it would get in production (models disable expire_on_commit)
+    @app.teardown_request
+    def remove_session(error):
+        db.session.remove()
+
+    with app.app_context():
+        yield app
+    reset_process_caches()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
@@ -3,10 +3,32 @@ Database helper utilities for Face Attendance System
 """
 import numpy as np
 import pickle
+import time
 from datetime import datetime, timedelta
 from typing import List, Optional, Tuple
+from sqlalchemy import Float, String, case, exists, func, insert, literal, select
+from sqlalchemy.orm import joinedload, raiseload
 from models import db, Student, FaceEncoding, AttendanceSession, AttendanceRecord, SyncQueue, SystemConfig
 
+# Active session ID, memoized per process until a session is created or ended
+# here, and for at most ACTIVE_SESSION_TTL seconds (other workers' changes)
+ACTIVE_SESSION_TTL = 2
+_active_session_cache = {'epoch': 0, 'epoch_seen': -1, 'expires': 0, 'session_id': None}
+
+# Public student ID -> (expiry, (database ID, name)); dropped on update/delete
+STUDENT_REF_TTL = 30
+STUDENT_REF_CACHE_SIZE = 1024
+_student_ref_cache = {}
+
+# Bumped by every write here to students, sessions or attendance, so caches of
+# pages that summarize them (the dashboard) can key on it
+_write_epoch = {'epoch': 0}
+
+# System settings as a key -> value dict, dropped by set_config() here and
+# refreshed after at most SETTINGS_TTL seconds (other workers' changes)
+SETTINGS_TTL = 30
+_settings_cache = {'expires': 0, 'settings': None}
+
 class DatabaseManager:
     """Database manager for handling common database operations"""
 
@@ -25,12 +47,44 @@ class DatabaseManager:
         )
         db.session.add(student)
         db.session.commit()
+        DatabaseManager.data_changed()
         return student
 
     @staticmethod
     def get_student_by_id(student_id: str) -> Optional[Student]:
         """Get student by student ID"""
-        return Student.query.filter_by(student_id=student_id).first()
+        return db.session.scalars(
+            select(Student).filter_by(student_id=student_id).limit(1)
+        ).first()
+
+    @staticmethod
+    def get_student_ref(student_id: str) -> Optional[Tuple[int, str]]:
+        """
+        Get (database ID, name) for a student ID, cached for STUDENT_REF_TTL seconds
+
+        Only hits are cached, so a newly created student is visible at once.
+        """
+        now = time.monotonic()
+        cached = _student_ref_cache.get(student_id)
+        if cached and cached[0] > now:
+            return cached[1]
+
+        row = db.session.execute(
+            select(Student.id, Student.name).filter_by(student_id=student_id).limit(1)
+        ).first()
+        if row is None:
+            return None
+
+        if len(_student_ref_cache) >= STUDENT_REF_CACHE_SIZE:
+            _student_ref_cache.clear()
+        ref = (row.id, row.name)
+        _student_ref_cache[student_id] = (now + STUDENT_REF_TTL, ref)
+        return ref
+
+    @staticmethod
+    def student_exists(student_id: str) -> bool:
+        """Check whether a student ID is taken without loading the row"""
+        return db.session.scalar(select(exists().where(Student.student_id == student_id)))
 
     @staticmethod
     def get_student_by_name(name: str) -> Optional[Student]:
@@ -40,9 +94,10 @@ class DatabaseManager:
     @staticmethod
     def get_all_students(status: str = 'active') -> List[Student]:
         """Get all students with given status"""
+        stmt = select(Student)
         if status:
-            return Student.query.filter_by(status=status).all()
-        return Student.query.all()
+            stmt = stmt.filter_by(status=status)
+        return db.session.scalars(stmt).all()
 
     @staticmethod
     def update_student(student_id: str, **kwargs) -> Optional[Student]:
@@ -54,6 +109,8 @@ class DatabaseManager:
                     setattr(student, key, value)
             student.updated_at = datetime.utcnow()
             db.session.commit()
+            _student_ref_cache.pop(student_id, None)
+            DatabaseManager.data_changed()
         return student
 
     @staticmethod
@@ -65,6 +122,8 @@ class DatabaseManager:
             # due to the cascade='all, delete-orphan' relationship defined in models
             db.session.delete(student)
             db.session.commit()
+            _student_ref_cache.pop(student_id, None)
+            DatabaseManager.data_changed()
             return True
         return False
 
@@ -72,24 +131,78 @@ class DatabaseManager:
     def add_face_encoding(student_id: str, encoding: np.ndarray,
                          quality_score: Optional[float] = None,
                          image_path: Optional[str] = None) -> Optional[FaceEncoding]:
-        """Add face encoding for a student"""
-        student = DatabaseManager.get_student_by_id(student_id)
-        if not student:
-            return None
+        """
+        Add face encoding for a student
 
+        Resolves the public student ID inside a single INSERT ... SELECT ...
+        RETURNING; returns None if the student does not exist.
+        """
         # Serialize numpy array to binary
         encoding_binary = pickle.dumps(encoding)
 
-        face_encoding = FaceEncoding(
-            student_id=student.id,
-            encoding=encoding_binary,
-            quality_score=quality_score,
-            image_path=image_path
-        )
-        db.session.add(face_encoding)
+        source = select(
+            Student.id,
+            literal(encoding_binary),
+            literal(quality_score, Float),
+            literal(image_path, String),
+            literal(datetime.utcnow()),
+            literal(True)
+        ).where(Student.student_id == student_id)
+
+        stmt = insert(FaceEncoding).from_select(
+            ['student_id', 'encoding', 'quality_score', 'image_path', 'created_at', 'is_active'],
+            source
+        ).returning(FaceEncoding)
+
+        face_encoding = db.session.scalars(stmt).first()
         db.session.commit()
         return face_encoding
 
+    @staticmethod
+    def add_face_encodings(student_db_id: int,
+                           encodings: List[Tuple[np.ndarray, Optional[float], Optional[str], datetime]]) -> int:
+        """
+        Add several face encodings for a student in one executemany INSERT and commit
+
+        Args:
+            student_db_id: Database ID of the student
+            encodings: (encoding, quality_score, image_path, created_at) tuples
+
+        Returns:
+            Number of encodings inserted
+        """
+        if not encodings:
+            return 0
+
+        rows = [{
+            'student_id': student_db_id,
+            'encoding': pickle.dumps(encoding),
+            'quality_score': quality_score,
+            'image_path': image_path,
+            'created_at': created_at,
+            'is_active': True
+        } for encoding, quality_score, image_path, created_at in encodings]
+
+        db.session.execute(insert(FaceEncoding), rows)
+        db.session.commit()
+        return len(rows)
+
+    @staticmethod
+    def count_face_encodings(student_db_id: int) -> int:
+        """Count a student's stored face encodings without loading them"""
+        return db.session.scalar(
+            select(func.count(FaceEncoding.id)).filter_by(student_id=student_db_id)
+        )
+
+    @staticmethod
+    def get_face_encoding_quality(student_db_id: int) -> Tuple[int, Optional[float], Optional[float]]:
+        """Count a student's stored face encodings with their mean and minimum quality, in one query"""
+        row = db.session.execute(
+            select(func.count(FaceEncoding.id), func.avg(FaceEncoding.quality_score),
+                   func.min(FaceEncoding.quality_score)).filter_by(student_id=student_db_id)
+        ).one()
+        return tuple(row)
+
     @staticmethod
     def get_all_face_encodings(active_only: bool = True) -> List[Tuple[str, np.ndarray, int]]:
         """
@@ -120,6 +233,46 @@ class DatabaseManager:
 
         return encodings_list
 
+    @staticmethod
+    def get_face_encoding_matrix(active_only: bool = True,
+                                 student_db_id: Optional[int] = None) -> Tuple[List[str], List[int], np.ndarray]:
+        """
+        Get all face encodings (or one student's) as a single preallocated matrix
+        Returns: Tuple of (student_names, student_db_ids, encodings) where
+        encodings is an (N, D) float32 array whose rows match the two lists
+        """
+        query = db.session.query(
+            Student.name,
+            FaceEncoding.encoding,
+            Student.id
+        ).join(
+            FaceEncoding, Student.id == FaceEncoding.student_id
+        )
+
+        if active_only:
+            query = query.filter(
+                Student.status == 'active',
+                FaceEncoding.is_active == True
+            )
+        if student_db_id is not None:
+            query = query.filter(Student.id == student_db_id)
+
+        results = query.all()
+
+        names = [name for name, _, _ in results]
+        student_ids = [student_id for _, _, student_id in results]
+        if not results:
+            return names, student_ids, np.empty((0, 0), dtype=np.float32)
+
+        # Deserialize encodings straight into their rows
+        first = pickle.loads(results[0][1])
+        encodings = np.empty((len(results), first.shape[-1]), dtype=np.float32)
+        encodings[0] = first
+        for i in range(1, len(results)):
+            encodings[i] = pickle.loads(results[i][1])
+
+        return names, student_ids, encodings
+
     @staticmethod
     def create_attendance_session(session_name: str, course_code: Optional[str] = None,
                                  course_name: Optional[str] = None,
@@ -137,17 +290,52 @@ class DatabaseManager:
         )
         db.session.add(session)
         db.session.commit()
+        DatabaseManager.invalidate_active_session()
+        DatabaseManager.data_changed()
         return session
 
     @staticmethod
     def get_active_session() -> Optional[AttendanceSession]:
-        """Get the currently active session"""
-        return AttendanceSession.query.filter_by(status='active').first()
+        """Get the currently active session (no query when there is none)"""
+        session_id = DatabaseManager.get_active_session_id()
+        if session_id is None:
+            return None
+        session = db.session.get(AttendanceSession, session_id)
+        return session if session is not None and session.status == 'active' else None
+
+    @staticmethod
+    def get_active_session_id() -> Optional[int]:
+        """Get the ID of the active session, cached until a session is created or ended"""
+        epoch = _active_session_cache['epoch']
+        now = time.monotonic()
+        if _active_session_cache['epoch_seen'] != epoch or _active_session_cache['expires'] < now:
+            session_id = db.session.scalar(
+                select(AttendanceSession.id).filter_by(status='active').limit(1)
+            )
+            _active_session_cache['session_id'] = session_id
+            _active_session_cache['epoch_seen'] = epoch
+            _active_session_cache['expires'] = now + ACTIVE_SESSION_TTL
+        return _active_session_cache['session_id']
+
+    @staticmethod
+    def invalidate_active_session():
+        """Force the next get_active_session_id() call to hit the database"""
+        _active_session_cache['epoch'] += 1
+
+    @staticmethod
+    def data_changed():
+        """Record a write to students, sessions or attendance (see data_epoch)"""
+        _write_epoch['epoch'] += 1
+
+    @staticmethod
+    def data_epoch() -> int:
+        """Counter bumped by every write here to students, sessions or attendance"""
+        return _write_epoch['epoch']
 
     @staticmethod
     def get_session_by_id(session_id: int) -> Optional[AttendanceSession]:
         """Get session by ID"""
-        return AttendanceSession.query.get(session_id)
+        return db.session.get(AttendanceSession, session_id)
 
     @staticmethod
     def end_session(session_id: int) -> Optional[AttendanceSession]:
@@ -157,6 +345,8 @@ class DatabaseManager:
             session.status = 'completed'
             session.end_time = datetime.utcnow()
             db.session.commit()
+            DatabaseManager.invalidate_active_session()
+            DatabaseManager.data_changed()
         return session
 
     @staticmethod
@@ -179,52 +369,133 @@ class DatabaseManager:
         Returns:
             AttendanceRecord if created, None if duplicate within cooldown period
         """
+        return DatabaseManager._insert_attendance(
+            session_id, Student.id == student_db_id, confidence_score,
+            status, image_path, cooldown_minutes
+        )
+
+    @staticmethod
+    def mark_attendance_by_student_id(session_id: int, student_id: str,
+                                      confidence_score: float,
+                                      status: str = 'present',
+                                      image_path: Optional[str] = None,
+                                      cooldown_minutes: int = 5) -> Optional[AttendanceRecord]:
+        """
+        Mark attendance using the public student ID string
+
+        Resolves the student inside the INSERT itself, so no separate lookup
+        is needed. Returns None if the student does not exist or was already
+        marked within the cooldown period.
+        """
+        return DatabaseManager._insert_attendance(
+            session_id, Student.student_id == student_id, confidence_score,
+            status, image_path, cooldown_minutes
+        )
+
+    @staticmethod
+    def _insert_attendance(session_id: int, student_clause,
+                           confidence_score: float,
+                           status: str,
+                           image_path: Optional[str],
+                           cooldown_minutes: int) -> Optional[AttendanceRecord]:
+        """
+        Insert an attendance record with a single INSERT ... SELECT ... RETURNING
+
+        The student lookup, cooldown check (NOT EXISTS) and late-status
+        decision all happen inside the one statement.
+        """
+        now = datetime.utcnow()
+        cooldown_time = now - timedelta(minutes=cooldown_minutes)
+
         # Check for recent attendance (prevent duplicates)
-        cooldown_time = datetime.utcnow() - timedelta(minutes=cooldown_minutes)
-        recent_record = AttendanceRecord.query.filter(
+        recent_record = exists().where(
             AttendanceRecord.session_id == session_id,
-            AttendanceRecord.student_id == student_db_id,
+            AttendanceRecord.student_id == Student.id,
             AttendanceRecord.timestamp >= cooldown_time
-        ).first()
-
-        if recent_record:
-            return None  # Already marked recently
+        )
 
         # Automatically determine late status if not explicitly set
+        status_expr = literal(status)
         if status == 'present':
-            session = AttendanceSession.query.get(session_id)
-            if session and session.start_time:
-                # Get late threshold from config (default 30 minutes)
-                late_threshold_str = DatabaseManager.get_config('late_threshold_minutes', '30')
-                try:
-                    late_threshold_minutes = int(late_threshold_str)
-                except ValueError:
-                    late_threshold_minutes = 30
-
-                # Calculate time difference
-                time_since_start = datetime.utcnow() - session.start_time
-                minutes_since_start = time_since_start.total_seconds() / 60
-
-                # Mark as late if beyond threshold
-                if minutes_since_start > late_threshold_minutes:
-                    status = 'late'
+            # Get late threshold from config (default 30 minutes)
+            late_threshold_str = DatabaseManager.get_config('late_threshold_minutes', '30')
+            try:
+                late_threshold_minutes = int(late_threshold_str)
+            except ValueError:
+                late_threshold_minutes = 30
+
+            # Late if the session started before the threshold cutoff
+            session_start = select(AttendanceSession.start_time).where(
+                AttendanceSession.id == session_id
+            ).scalar_subquery()
+            late_cutoff = now - timedelta(minutes=late_threshold_minutes)
+            status_expr = case((session_start < late_cutoff, 'late'), else_='present')
 
         # Create new attendance record
-        record = AttendanceRecord(
-            session_id=session_id,
-            student_id=student_db_id,
-            confidence_score=confidence_score,
-            status=status,
-            image_path=image_path
-        )
-        db.session.add(record)
+        source = select(
+            literal(session_id),
+            Student.id,
+            literal(confidence_score),
+            status_expr,
+            literal(image_path, String),
+            literal(now)
+        ).where(student_clause, ~recent_record)
+
+        stmt = insert(AttendanceRecord).from_select(
+            ['session_id', 'student_id', 'confidence_score', 'status', 'image_path', 'timestamp'],
+            source
+        ).returning(AttendanceRecord)
+
+        record = db.session.scalars(stmt).first()
         db.session.commit()
+        if record is not None:
+            DatabaseManager.data_changed()
         return record
 
     @staticmethod
     def get_session_attendance(session_id: int) -> List[AttendanceRecord]:
-        """Get all attendance records for a session"""
-        return AttendanceRecord.query.filter_by(session_id=session_id).all()
+        """Get all attendance records for a session, with their students joined in"""
+        return AttendanceRecord.query.options(
+            joinedload(AttendanceRecord.student), raiseload('*')
+        ).filter_by(session_id=session_id).all()
+
+    @staticmethod
+    def get_session_report_records(session_id: int) -> List[dict]:
+        """
+        Get a session's attendance records as report rows, in one query
+
+        Each row has the AttendanceRecord.to_dict() keys plus the student's
+        email and program, read straight from the joined columns.
+        """
+        stmt = select(
+            AttendanceRecord.__table__,
+            Student.name.label('student_name'),
+            Student.student_id.label('student_student_id'),
+            Student.email.label('student_email'),
+            Student.program.label('student_program')
+        ).outerjoin(Student, AttendanceRecord.student_id == Student.id).where(
+            AttendanceRecord.session_id == session_id
+        ).order_by(AttendanceRecord.id)
+
+        records = []
+        for row in db.session.execute(stmt):
+            records.append({
+                'id': row.id,
+                'session_id': row.session_id,
+                'student_id': row.student_id,
+                'student_name': row.student_name,
+                'student_student_id': row.student_student_id,
+                'timestamp': row.timestamp.isoformat() if row.timestamp else None,
+                'confidence_score': row.confidence_score,
+                'status': row.status,
+                'image_path': row.image_path,
+                'notes': row.notes,
+                'synced_to_cloud': row.synced_to_cloud,
+                'created_at': row.created_at.isoformat() if row.created_at else None,
+                'student_email': row.student_email,
+                'student_program': row.student_program
+            })
+        return records
 
     @staticmethod
     def get_student_attendance_history(student_id: str,
@@ -300,32 +571,50 @@ class DatabaseManager:
 
     @staticmethod
     def get_attendance_stats(session_id: Optional[int] = None) -> dict:
-        """Get attendance statistics"""
+        """Get attendance statistics (one aggregate query)"""
+        columns = [
+            func.count(AttendanceRecord.id),
+            func.count(case((AttendanceRecord.status == 'present', 1))),
+            func.count(case((AttendanceRecord.status == 'late', 1)))
+        ]
         if session_id:
-            total = AttendanceRecord.query.filter_by(session_id=session_id).count()
-            present = AttendanceRecord.query.filter_by(
-                session_id=session_id, status='present'
-            ).count()
-            late = AttendanceRecord.query.filter_by(
-                session_id=session_id, status='late'
-            ).count()
-        else:
-            total = AttendanceRecord.query.count()
-            present = AttendanceRecord.query.filter_by(status='present').count()
-            late = AttendanceRecord.query.filter_by(status='late').count()
+            columns.append(
+                select(func.count(Student.id)).filter_by(status='active').scalar_subquery()
+            )
+
+        stmt = select(*columns)
+        if session_id:
+            stmt = stmt.filter(AttendanceRecord.session_id == session_id)
+
+        total, present, late, *active_students = db.session.execute(stmt).one()
 
         return {
             'total': total,
             'present': present,
             'late': late,
-            'absent': max(0, Student.query.filter_by(status='active').count() - total) if session_id else 0
+            'absent': max(0, active_students[0] - total) if session_id else 0
         }
 
+    @staticmethod
+    def get_dashboard_counts(since: datetime) -> Tuple[int, int, int]:
+        """
+        Get dashboard counts in one query
+
+        Returns:
+            Tuple of (active students, sessions, attendance records since `since`)
+        """
+        return tuple(db.session.execute(select(
+            select(func.count(Student.id)).filter_by(status='active').scalar_subquery(),
+            select(func.count(AttendanceSession.id)).scalar_subquery(),
+            select(func.count(AttendanceRecord.id)).filter(
+                AttendanceRecord.timestamp >= since
+            ).scalar_subquery()
+        )).one())
+
     @staticmethod
     def get_config(key: str, default: Optional[str] = None) -> Optional[str]:
         """Get system configuration value by key"""
-        config = SystemConfig.query.filter_by(key=key).first()
-        return config.value if config else default
+        return DatabaseManager.get_settings().get(key, default)
 
     @staticmethod
     def set_config(key: str, value: str, description: Optional[str] = None) -> SystemConfig:
@@ -344,9 +633,59 @@ class DatabaseManager:
             )
             db.session.add(config)
         db.session.commit()
+        _settings_cache['settings'] = None
         return config
 
+    @staticmethod
+    def set_configs(values: dict, descriptions: Optional[dict] = None):
+        """
+        Set several system configuration values in one upsert
+
+        Args:
+            values: Key -> value
+            descriptions: Optional key -> description (kept as is when absent)
+        """
+        if not values:
+            return
+        descriptions = descriptions or {}
+        dialect = db.engine.dialect.name
+        if dialect not in ('sqlite', 'postgresql'):
+            for key, value in values.items():
+                DatabaseManager.set_config(key, value, descriptions.get(key))
+            return
+
+        if dialect == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert as upsert
+        else:
+            from sqlalchemy.dialects.postgresql import insert as upsert
+        now = datetime.utcnow()
+        stmt = upsert(SystemConfig).values([
+            {'key': key, 'value': value, 'description': descriptions.get(key), 'updated_at': now}
+            for key, value in values.items()
+        ])
+        db.session.execute(stmt.on_conflict_do_update(
+            index_elements=[SystemConfig.key],
+            set_={
+                'value': stmt.excluded.value,
+                'description': func.coalesce(stmt.excluded.description, SystemConfig.description),
+                'updated_at': stmt.excluded.updated_at
+            }
+        ))
+        db.session.commit()
+        _settings_cache['settings'] = None
+
     @staticmethod
     def get_all_configs() -> List[SystemConfig]:
         """Get all system configurations"""
         return SystemConfig.query.all()
+
+    @staticmethod
+    def get_settings() -> dict:
+        """Get all system configuration values by key (cached, see SETTINGS_TTL)"""
+        now = time.monotonic()
+        if _settings_cache['settings'] is None or _settings_cache['expires'] < now:
+            _settings_cache['settings'] = dict(
+                db.session.execute(select(SystemConfig.key, SystemConfig.value)).all()
+            )
+            _settings_cache['expires'] = now + SETTINGS_TTL
+        return dict(_settings_cache['settings'])
@@ -23,7 +23,8 @@ class EmailService:
         if not self.smtp_email or not self.smtp_password:
             raise ValueError("SMTP email credentials not configured. Set SMTP_EMAIL and SMTP_PASSWORD in .env")
 
-    def send_attendance_report(self, recipient_email, session_data, excel_path, spreadsheet_url=None):
+    def send_attendance_report(self, recipient_email, session_data, excel_path=None, spreadsheet_url=None,
+                               excel_bytes=None, excel_filename=None):
         """
         Send attendance report email with Excel attachment
 
@@ -32,6 +33,8 @@ class EmailService:
             session_data: Dictionary with session information
             excel_path: Path to Excel file to attach
             spreadsheet_url: Optional Google Sheets URL to include
+            excel_bytes: Excel file contents, attached instead of reading excel_path
+            excel_filename: Attachment filename for excel_bytes
 
         Returns:
             bool: True if successful, False otherwise
@@ -43,7 +46,7 @@ class EmailService:
                 return False
 
             # Validate Excel file exists
-            if not os.path.exists(excel_path):
+            if excel_bytes is None and not os.path.exists(excel_path):
                 print(f"[ERROR] Excel file not found: {excel_path}")
                 return False
 
@@ -58,11 +61,13 @@ class EmailService:
             msg.attach(MIMEText(body, 'html'))
 
             # Attach Excel file
-            with open(excel_path, 'rb') as f:
-                excel_attachment = MIMEApplication(f.read(), _subtype='xlsx')
+            if excel_bytes is None:
+                with open(excel_path, 'rb') as f:
+                    excel_bytes = f.read()
                 excel_filename = os.path.basename(excel_path)
-                excel_attachment.add_header('Content-Disposition', 'attachment', filename=excel_filename)
-                msg.attach(excel_attachment)
+            excel_attachment = MIMEApplication(excel_bytes, _subtype='xlsx')
+            excel_attachment.add_header('Content-Disposition', 'attachment', filename=excel_filename)
+            msg.attach(excel_attachment)
 
             # Send email
             print(f"[INFO] Connecting to SMTP server: {self.smtp_server}:{self.smtp_port}")
@@ -258,7 +263,8 @@ class EmailService:
         return html_body
 
 
-def send_attendance_report_email(recipient_email, session_data, excel_path, spreadsheet_url=None):
+def send_attendance_report_email(recipient_email, session_data, excel_path=None, spreadsheet_url=None,
+                                 excel_bytes=None, excel_filename=None):
     """
     Helper function to send attendance report email
 
@@ -267,6 +273,8 @@ def send_attendance_report_email(recipient_email, session_data, excel_path, spre
         session_data: Dictionary with session information
         excel_path: Path to Excel file to attach
         spreadsheet_url: Optional Google Sheets URL
+        excel_bytes: Excel file contents, attached instead of reading excel_path
+        excel_filename: Attachment filename for excel_bytes
 
     Returns:
         bool: True if successful, False otherwise
@@ -277,7 +285,9 @@ def send_attendance_report_email(recipient_email, session_data, excel_path, spre
             recipient_email,
             session_data,
             excel_path,
-            spreadsheet_url
+            spreadsheet_url,
+            excel_bytes=excel_bytes,
+            excel_filename=excel_filename
         )
     except Exception as error:
         print(f"[ERROR] Failed to initialize email service: {error}")
@@ -2,7 +2,9 @@
 Google Sheets Service for Face Attendance System
 Creates and populates Google Sheets with attendance data
 """
+import io
 import os
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from google.oauth2 import service_account
 from googleapiclient.discovery import build
@@ -10,6 +12,12 @@ from googleapiclient.errors import HttpError
 import openpyxl
 from openpyxl.styles import Font, Alignment, PatternFill
 
+# Seconds to wait for Google Sheets before settling for the Excel-only report
+SHEETS_REPORT_BUDGET = 10
+
+# Runs Google Sheets exports, so a report waits at most SHEETS_REPORT_BUDGET for one
+_export_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix='report-export')
+
 
 class GoogleSheetsService:
     """Service for creating and managing Google Sheets with attendance data"""
@@ -303,13 +311,26 @@ class GoogleSheetsService:
             print(f"[ERROR] Failed to format sheet: {error}")
             # Non-critical, so we don't raise
 
+    def delete_spreadsheet(self, spreadsheet_id):
+        """
+        Delete a Google Sheet created by this app from Drive
+
+        Args:
+            spreadsheet_id: ID of the spreadsheet
+
+        Raises:
+            HttpError: If the Drive API refuses the deletion
+        """
+        self.drive_service.files().delete(fileId=spreadsheet_id).execute()
+        print(f"[INFO] Deleted unused Google Sheet: {spreadsheet_id}")
+
     def export_to_excel(self, spreadsheet_id, output_path):
         """
         Export Google Sheet to Excel file
 
         Args:
             spreadsheet_id: ID of the spreadsheet
-            output_path: Path where Excel file should be saved
+            output_path: Path where Excel file should be saved, or a binary file object
 
         Returns:
             str: Path to the created Excel file
@@ -362,7 +383,8 @@ class GoogleSheetsService:
 
             # Save Excel file
             wb.save(output_path)
-            print(f"[INFO] Exported to Excel: {output_path}")
+            if isinstance(output_path, str):
+                print(f"[INFO] Exported to Excel: {output_path}")
 
             return output_path
 
@@ -374,20 +396,22 @@ class GoogleSheetsService:
             raise
 
 
-def create_and_export_attendance_report(session_data, attendance_records, output_dir='/tmp'):
+def create_and_export_attendance_report(session_data, attendance_records, output_dir=None):
     """
     Helper function to create Google Sheet and export to Excel
 
     Args:
         session_data: Dictionary with session information
         attendance_records: List of attendance record dictionaries
-        output_dir: Directory where Excel file should be saved
+        output_dir: Directory where Excel file should be saved; when None the
+            file is built in memory and returned as excel_bytes
 
     Returns:
         dict: {
             'spreadsheet_id': str,
             'spreadsheet_url': str,
-            'excel_path': str,
+            'excel_filename': str,
+            'excel_path': str,  # or 'excel_bytes': bytes, without output_dir
             'title': str
         }
     """
@@ -401,18 +425,25 @@ def create_and_export_attendance_report(session_data, attendance_records, output
     session_name = session_data.get('session_name', 'Attendance').replace(' ', '_')
     date_str = datetime.now().strftime('%Y%m%d_%H%M%S')
     excel_filename = f"Attendance_{session_name}_{date_str}.xlsx"
-    excel_path = os.path.join(output_dir, excel_filename)
 
     # Export to Excel
-    sheets_service.export_to_excel(sheet_result['spreadsheet_id'], excel_path)
+    if output_dir is None:
+        excel_file = io.BytesIO()
+        sheets_service.export_to_excel(sheet_result['spreadsheet_id'], excel_file)
+        excel = {'excel_bytes': excel_file.getvalue()}
+    else:
+        excel_path = os.path.join(output_dir, excel_filename)
+        sheets_service.export_to_excel(sheet_result['spreadsheet_id'], excel_path)
+        excel = {'excel_path': excel_path}
 
     return {
         **sheet_result,
-        'excel_path': excel_path
+        'excel_filename': excel_filename,
+        **excel
     }
 
 
-def create_excel_only_report(session_data, attendance_records, output_dir='/tmp'):
+def create_excel_only_report(session_data, attendance_records, output_dir=None):
     """
     Create Excel attendance report WITHOUT Google Sheets
     Use this as a fallback when Google Sheets service account has permission issues
@@ -420,11 +451,13 @@ def create_excel_only_report(session_data, attendance_records, output_dir='/tmp'
     Args:
         session_data: Dictionary with session information
         attendance_records: List of attendance record dictionaries
-        output_dir: Directory where Excel file should be saved
+        output_dir: Directory where Excel file should be saved; when None the
+            file is built in memory and returned as excel_bytes
 
     Returns:
         dict: {
-            'excel_path': str,
+            'excel_filename': str,
+            'excel_path': str,  # or 'excel_bytes': bytes, without output_dir
             'title': str
         }
     """
@@ -438,7 +471,6 @@ def create_excel_only_report(session_data, attendance_records, output_dir='/tmp'
         session_name_safe = session_name.replace(' ', '_')
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
         excel_filename = f"Attendance_{session_name_safe}_{timestamp}.xlsx"
-        excel_path = os.path.join(output_dir, excel_filename)
 
         # Prepare data (same format as Google Sheets)
         values = [
@@ -503,14 +535,77 @@ def create_excel_only_report(session_data, attendance_records, output_dir='/tmp'
             ws.column_dimensions[column_letter].width = adjusted_width
 
         # Save Excel file
+        if output_dir is None:
+            excel_file = io.BytesIO()
+            wb.save(excel_file)
+            print(f"[INFO] Created Excel-only report: {excel_filename}")
+            return {
+                'excel_filename': excel_filename,
+                'excel_bytes': excel_file.getvalue(),
+                'title': sheet_title
+            }
+
+        excel_path = os.path.join(output_dir, excel_filename)
         wb.save(excel_path)
         print(f"[INFO] Created Excel-only report: {excel_path}")
 
         return {
+            'excel_filename': excel_filename,
             'excel_path': excel_path,
             'title': sheet_title
         }
 
     except Exception as error:
         print(f"[ERROR] Failed to create Excel report: {error}")
-        raise
\ No newline at end of file
+        raise
+
+
+def _remove_late_sheets_report(future):
+    """Done callback for a Google Sheets report that missed its budget: delete its sheet and Excel file"""
+    if future.cancelled() or future.exception() is not None:
+        return
+    result = future.result()
+    excel_path = result.get('excel_path')
+    try:
+        if excel_path and os.path.exists(excel_path):
+            os.remove(excel_path)
+    except OSError as error:
+        print(f"[WARNING] Failed to clean up unused report {excel_path}: {error}")
+    try:
+        GoogleSheetsService().delete_spreadsheet(result['spreadsheet_id'])
+    except Exception as error:
+        print(f"[WARNING] Failed to delete unused Google Sheet {result['spreadsheet_id']}: {error}")
+
+
+def create_attendance_report(session_data, attendance_records, output_dir=None,
+                             sheets_budget=SHEETS_REPORT_BUDGET):
+    """
+    Create the attendance report, preferring Google Sheets over Excel-only
+
+    The Google Sheets export gets sheets_budget seconds; the Excel-only
+    report is built only if it fails or runs out of time. Without output_dir
+    the Excel file is kept in memory (excel_bytes). A Google Sheets report
+    that finishes after its budget has its spreadsheet and Excel file deleted.
+
+    Returns:
+        The result of create_and_export_attendance_report, or of
+        create_excel_only_report when Google Sheets is unavailable
+    """
+    sheets = _export_pool.submit(create_and_export_attendance_report,
+                                 session_data, attendance_records, output_dir)
+
+    try:
+        result = sheets.result(timeout=sheets_budget)
+    except Exception:
+        # Google Sheets failed (likely permission/quota issues) or is too slow
+        print("[INFO] Using Excel-only export (Google Sheets unavailable)")
+        sheets.add_done_callback(_remove_late_sheets_report)
+        excel_only_dir = None
+        if output_dir is not None:
+            # Separate directory: a late Sheets export may name its file after the same second
+            excel_only_dir = os.path.join(output_dir, 'excel-only')
+            os.makedirs(excel_only_dir, exist_ok=True)
+        return create_excel_only_report(session_data, attendance_records, excel_only_dir)
+
+    print("[INFO] Google Sheets report created successfully")
+    return result
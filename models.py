@@ -3,9 +3,12 @@ Database models for Face Attendance System
 """
 from datetime import datetime
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import Index
+from sqlalchemy import Index, func, select
+from sqlalchemy.orm import column_property
 
-db = SQLAlchemy()
+# Objects stay readable after commit; handlers serialize them in the response
+# right after writing, and the session ends with the request anyway
+db = SQLAlchemy(session_options={'expire_on_commit': False})
 
 class Student(db.Model):
     """Student model for storing registered students"""
@@ -44,6 +47,15 @@ class Student(db.Model):
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
 
+    def to_summary_dict(self):
+        """Identifying fields only, for write responses (GET the student for the rest)"""
+        return {
+            'id': self.id,
+            'student_id': self.student_id,
+            'name': self.name,
+            'status': self.status
+        }
+
 class FaceEncoding(db.Model):
     """Face encoding model for storing face embeddings"""
     __tablename__ = 'face_encodings'
@@ -113,7 +125,7 @@ class AttendanceSession(db.Model):
             'status': self.status,
             'notes': self.notes,
             'created_at': self.created_at.isoformat() if self.created_at else None,
-            'attendance_count': len(self.attendance_records) if self.attendance_records else 0
+            'attendance_count': self.attendance_count
         }
 
 class AttendanceRecord(db.Model):
@@ -135,6 +147,7 @@ class AttendanceRecord(db.Model):
     # Composite indexes for common queries
     __table_args__ = (
         Index('idx_session_student', 'session_id', 'student_id'),
+        Index('idx_session_timestamp', session_id, timestamp.desc()),
         Index('idx_student_timestamp', 'student_id', 'timestamp'),
         Index('idx_sync_status', 'synced_to_cloud', 'sync_attempts'),
     )
@@ -144,12 +157,13 @@ class AttendanceRecord(db.Model):
 
     def to_dict(self):
         """Convert attendance record object to dictionary"""
+        student = self.student  # Resolve the relationship attribute once
         return {
             'id': self.id,
             'session_id': self.session_id,
             'student_id': self.student_id,
-            'student_name': self.student.name if self.student else None,
-            'student_student_id': self.student.student_id if self.student else None,
+            'student_name': student.name if student else None,
+            'student_student_id': student.student_id if student else None,
             'timestamp': self.timestamp.isoformat() if self.timestamp else None,
             'confidence_score': self.confidence_score,
             'status': self.status,
@@ -159,6 +173,17 @@ class AttendanceRecord(db.Model):
             'created_at': self.created_at.isoformat() if self.created_at else None
         }
 
+# Per-session record count as a correlated COUNT subquery. Deferred, so it
+# costs one small query when read on its own, and nothing extra when list
+# queries load it up front with undefer().
+AttendanceSession.attendance_count = column_property(
+    select(func.count(AttendanceRecord.id))
+    .where(AttendanceRecord.session_id == AttendanceSession.id)
+    .correlate_except(AttendanceRecord)
+    .scalar_subquery(),
+    deferred=True
+)
+
 class SystemConfig(db.Model):
     """System configuration model for storing application settings"""
     __tablename__ = 'system_config'
@@ -6,17 +6,165 @@ import os
 # Set headless mode for OpenCV before importing cv2
 os.environ['QT_QPA_PLATFORM'] = 'offscreen'
 
+from config import Config  # First: sets the BLAS thread limits numpy reads on import
 import cv2
+import glob
 import numpy as np
+import onnxruntime as ort
 from picamera2 import Picamera2
 from insightface.app import FaceAnalysis
+from insightface.model_zoo.model_zoo import ModelRouter
+from insightface.utils import DEFAULT_MP_NAME, ensure_available
 import time
-from datetime import datetime
 from typing import Optional, Tuple, List
-from config import Config
 from database import DatabaseManager
+from models import db
 from flask import Flask
+import logging
 import threading
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import faiss  # Optional: SIMD nearest-neighbour search for large galleries
+except ImportError:
+    faiss = None
+
+try:
+    from turbojpeg import TurboJPEG, TJPF_BGR  # Optional: libjpeg-turbo JPEG encoder
+except ImportError:
+    TurboJPEG = None
+
+# Per-frame diagnostics go to DEBUG so they cost nothing unless enabled
+logger = logging.getLogger(__name__)
+
+# Multipart framing for the MJPEG streams, pre-encoded once
+MJPEG_PART_HEADER = b'--frame\r\nContent-Type: image/jpeg\r\nContent-Length: '
+MJPEG_HEADER_END = b'\r\n\r\n'
+MJPEG_PART_END = b'\r\n'
+
+# OpenCV work here is small per-frame ops; its own pool only competes with ORT
+cv2.setNumThreads(Config.CV_NUM_THREADS)
+
+
+class FrameBroadcast:
+    """
+    One producer thread per stream, with the latest MJPEG part fanned out to
+    every viewer
+
+    Capture, detection and JPEG encoding run on the producer thread, so a
+    viewer's request thread only waits for the next part and writes it to
+    its socket. A slow viewer skips parts rather than queueing them.
+    """
+
+    def __init__(self, name: str, start, stop, is_running):
+        """
+        Args:
+            name: Producer thread name
+            start, stop, is_running: The service's streaming flag for this stream
+        """
+        self.name = name
+        self._start = start
+        self._stop = stop
+        self._is_running = is_running
+        self._cond = threading.Condition()
+        self._producer = None
+        self._producing = False
+        self._viewers = 0
+        self._latest_part = None
+        self._part_seq = 0
+
+    def _produce(self, parts):
+        """Run the part generator on the producer thread, publishing each part"""
+        try:
+            for part in parts():
+                with self._cond:
+                    self._latest_part = part
+                    self._part_seq += 1
+                    self._cond.notify_all()
+        finally:
+            with self._cond:
+                # A stopped producer winding down must not clear its successor's state
+                if self._producer is threading.current_thread():
+                    self._producing = False
+                self._cond.notify_all()
+
+    def frames(self, parts):
+        """
+        MJPEG parts of the stream, for one viewer
+
+        The first viewer starts a producer thread running parts() (a callable
+        returning the part generator); later viewers share it. The stream
+        stops when the last viewer disconnects or the streaming flag is cleared.
+        """
+        with self._cond:
+            self._viewers += 1
+
+        # Attach to a live producer, or start one once any producer that is
+        # stopping (last viewer gone, or streaming flag cleared) has exited
+        while True:
+            with self._cond:
+                producer = self._producer
+                if self._producing and self._is_running():
+                    break
+                if producer is None or not producer.is_alive():
+                    self._start()
+                    self._producing = True
+                    self._producer = threading.Thread(
+                        target=self._produce, args=(parts,), name=self.name, daemon=True
+                    )
+                    self._producer.start()
+                    break
+            producer.join()
+
+        with self._cond:
+            seq = self._part_seq
+
+        try:
+            while True:
+                with self._cond:
+                    while self._part_seq == seq and self._producing:
+                        self._cond.wait()
+                    if self._part_seq == seq:
+                        break  # Producer stopped
+                    seq = self._part_seq
+                    part = self._latest_part
+                yield part
+        finally:
+            with self._cond:
+                self._viewers -= 1
+                # Decided under the lock, so a viewer arriving now starts a
+                # new producer instead of attaching to the one being stopped
+                if self._viewers == 0 and self._producing:
+                    logger.info("Last viewer disconnected from %s", self.name)
+                    self._producing = False
+                    self._stop()
+
+
+class SessionOptionsFaceAnalysis(FaceAnalysis):
+    """
+    FaceAnalysis whose ONNX Runtime sessions are built with SessionOptions
+
+    insightface 0.7.x passes only providers/provider_options from
+    FaceAnalysis down to InferenceSession, so the thread counts would be
+    dropped. This loads the model pack the way FaceAnalysis.__init__ does
+    (sorted *.onnx files, first model per task) but creates each session
+    once, with sess_options.
+    """
+
+    def __init__(self, sess_options, providers, name=DEFAULT_MP_NAME, root='~/.insightface'):
+        ort.set_default_logger_severity(3)
+        self.models = {}
+        self.model_dir = ensure_available('models', name, root=root)
+        for onnx_file in sorted(glob.glob(os.path.join(self.model_dir, '*.onnx'))):
+            model = ModelRouter(onnx_file).get_model(sess_options=sess_options, providers=providers)
+            if model is None:
+                logger.warning("Model not recognized: %s", onnx_file)
+            elif model.taskname not in self.models:
+                self.models[model.taskname] = model
+        if 'detection' not in self.models:
+            raise RuntimeError(f"No detection model found in {self.model_dir}")
+        self.det_model = self.models['detection']
+
 
 class FaceRecognitionService:
     """Face recognition service with real-time detection and database integration"""
@@ -41,7 +189,10 @@ class FaceRecognitionService:
 
         # Initialize InsightFace
         print("[INFO] Initializing InsightFace...")
-        self.app = FaceAnalysis(providers=[self.config.EXECUTION_PROVIDER])
+        sess_options = ort.SessionOptions()
+        sess_options.intra_op_num_threads = self.config.ORT_INTRA_OP_THREADS
+        sess_options.inter_op_num_threads = self.config.ORT_INTER_OP_THREADS
+        self.app = SessionOptionsFaceAnalysis(sess_options, providers=[self.config.EXECUTION_PROVIDER])
         self.app.prepare(ctx_id=0, det_size=self.config.INSIGHTFACE_DET_SIZE)
 
         # Initialize camera
@@ -53,6 +204,18 @@ class FaceRecognitionService:
         )
         self.picam2.configure(camera_config)
 
+        # Distances are compared squared, so square the threshold once
+        self._thr_sq = self.config.RECOGNITION_THRESHOLD ** 2
+
+        # One encoder handle reused for every stream frame
+        self._jpeg = None
+        if TurboJPEG is not None:
+            try:
+                self._jpeg = TurboJPEG()
+            except (OSError, RuntimeError) as e:
+                print(f"[WARNING] libturbojpeg unavailable, using OpenCV JPEG encoder: {e}")
+        self._jpeg_params = [cv2.IMWRITE_JPEG_QUALITY, self.config.JPEG_QUALITY]
+
         # Load face encodings from database
         self.known_encodings = []
         self.known_names = []
@@ -61,13 +224,13 @@ class FaceRecognitionService:
 
         # FPS tracking
         self.frame_count = 0
-        self.start_time = time.time()
+        self.start_time = time.monotonic()
         self.fps = 0
 
         # Frame processing optimization
         self.process_every = self.config.PROCESS_EVERY_N_FRAMES
         self.frame_counter = 0
-        self.last_faces = []
+        self.last_faces = []  # (bbox, name, distance, student_db_id) from the last detection
 
         # Camera started flag
         self.camera_started = False
@@ -76,23 +239,98 @@ class FaceRecognitionService:
         self._streaming_lock = threading.Lock()
         self._recognition_streaming = False
         self._enrollment_streaming = False
+        # Set while any stream is being consumed; lets hot paths skip the lock
+        self._has_consumer = threading.Event()
+
+        # Enrollment photos are written to disk off the request thread
+        self._io_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix='enrollment-io')
+        # Writes not yet confirmed, keyed by path (see photo_saved)
+        self._photo_writes = {}
+        self._photo_writes_lock = threading.Lock()
+
+        # Both MJPEG streams are produced off the request threads and shared
+        # by every viewer (see recognition_frames, enrollment_preview_frames)
+        self._recognition_broadcast = FrameBroadcast(
+            'recognition-stream', self.start_recognition_stream,
+            self.stop_recognition_stream, self.is_recognition_streaming
+        )
+        self._preview_broadcast = FrameBroadcast(
+            'enrollment-preview', self.start_enrollment_stream,
+            self.stop_enrollment_stream, self.is_enrollment_streaming
+        )
 
     def load_encodings_from_db(self):
         """Load face encodings from database"""
         print("[INFO] Loading face encodings from database...")
-        encodings_list = DatabaseManager.get_all_face_encodings(active_only=True)
+        names, student_ids, encodings = DatabaseManager.get_face_encoding_matrix(active_only=True)
+        self._set_gallery(names, student_ids, encodings)
 
-        self.known_encodings = []
-        self.known_names = []
-        self.known_ids = []
+        print(f"[INFO] Loaded {len(self.known_encodings)} face encodings")
+        print(f"[INFO] Registered students: {len(set(self.known_ids))}")
 
-        for name, encoding, student_id in encodings_list:
-            self.known_encodings.append(encoding)
-            self.known_names.append(name)
-            self.known_ids.append(student_id)
+    def load_student_encodings_from_db(self, student_db_id: int):
+        """
+        Refresh one student's face encodings (e.g. after enrollment)
 
-        print(f"[INFO] Loaded {len(self.known_encodings)} face encodings")
-        print(f"[INFO] Registered students: {set(self.known_names)}")
+        Only that student's rows are read and unpickled; everyone else's
+        stay as loaded, so the cost does not grow with the number of
+        enrolled students.
+        """
+        names, student_ids, encodings = DatabaseManager.get_face_encoding_matrix(
+            active_only=True, student_db_id=student_db_id
+        )
+        keep = [i for i, known_id in enumerate(self.known_ids) if known_id != student_db_id]
+        if keep and len(encodings):
+            encodings = np.concatenate((self.known_encodings[keep], encodings))
+        elif keep:
+            encodings = self.known_encodings[keep]
+        self._set_gallery([self.known_names[i] for i in keep] + names,
+                          [self.known_ids[i] for i in keep] + student_ids,
+                          np.ascontiguousarray(encodings, dtype=np.float32))
+
+        print(f"[INFO] Refreshed encodings of student {student_db_id}: "
+              f"{len(self.known_encodings)} face encodings loaded")
+
+    def _set_gallery(self, names: List[str], student_ids: List[int], encodings: np.ndarray):
+        """Install the known faces and the structures recognize_face searches"""
+        self.known_encodings = encodings
+        self.known_names = names
+        self.known_ids = student_ids  # Database IDs
+
+        # Lookup tables with a trailing "Unknown" slot so recognize_face can
+        # resolve a miss by index instead of branching on the threshold
+        self._lookup_names = self.known_names + ["Unknown"]
+        self._lookup_ids = self.known_ids + [None]
+
+        # Contiguous float32 gallery (and FAISS index when it pays off)
+        self._gallery = encodings
+        self._gallery_sq = np.einsum('ij,ij->i', encodings, encodings)
+        self._index = self._build_index(self._gallery)
+
+    def _build_index(self, gallery: np.ndarray):
+        """
+        Build a FAISS index over the gallery
+
+        Returns None when FAISS is unavailable or the gallery is small enough
+        that the NumPy scan is just as fast. Uses L2 metrics so distances stay
+        comparable with RECOGNITION_THRESHOLD (embeddings are not normalized).
+        """
+        if faiss is None or len(gallery) < self.config.FAISS_MIN_GALLERY:
+            return None
+
+        dim = gallery.shape[1]
+        if len(gallery) >= self.config.FAISS_IVF_MIN_GALLERY:
+            # Inverted lists with ~40 training points each; cheap enough to
+            # retrain from scratch on every reload
+            nlist = min(64, len(gallery) // 40)
+            index = faiss.IndexIVFFlat(faiss.IndexFlatL2(dim), dim, nlist)
+            index.train(gallery)
+            index.nprobe = min(self.config.FAISS_IVF_NPROBE, nlist)
+        else:
+            index = faiss.IndexFlatL2(dim)
+        index.add(gallery)
+        print(f"[INFO] Built FAISS {type(index).__name__} over {len(gallery)} encodings")
+        return index
 
     def start_camera(self):
         """Start the camera"""
@@ -109,16 +347,25 @@ class FaceRecognitionService:
             self.camera_started = False
             print("[INFO] Camera stopped")
 
+    def _update_consumer_event(self):
+        """Sync the consumer event with the streaming flags (caller holds the lock)"""
+        if self._recognition_streaming or self._enrollment_streaming:
+            self._has_consumer.set()
+        else:
+            self._has_consumer.clear()
+
     def start_recognition_stream(self):
         """Signal that recognition streaming should start"""
         with self._streaming_lock:
             self._recognition_streaming = True
+            self._update_consumer_event()
             print("[INFO] Recognition streaming flag set to True")
 
     def stop_recognition_stream(self):
         """Signal that recognition streaming should stop"""
         with self._streaming_lock:
             self._recognition_streaming = False
+            self._update_consumer_event()
             print("[INFO] Recognition streaming flag set to False")
 
     def is_recognition_streaming(self):
@@ -130,12 +377,14 @@ class FaceRecognitionService:
         """Signal that enrollment streaming should start"""
         with self._streaming_lock:
             self._enrollment_streaming = True
+            self._update_consumer_event()
             print("[INFO] Enrollment streaming flag set to True")
 
     def stop_enrollment_stream(self):
         """Signal that enrollment streaming should stop"""
         with self._streaming_lock:
             self._enrollment_streaming = False
+            self._update_consumer_event()
             print("[INFO] Enrollment streaming flag set to False")
 
     def is_enrollment_streaming(self):
@@ -153,25 +402,43 @@ class FaceRecognitionService:
         Returns:
             Tuple of (name, distance, student_db_id)
         """
+        return self.recognize_faces(np.asarray(embedding, dtype=np.float32).reshape(1, -1))[0]
+
+    def recognize_faces(self, embeddings: np.ndarray) -> List[Tuple[str, float, Optional[int]]]:
+        """
+        Match every face in a frame against the gallery in one batch
+
+        Args:
+            embeddings: (F, D) float32 array of face embeddings
+
+        Returns:
+            List of (name, distance, student_db_id) tuples, one per row
+        """
         if len(self.known_encodings) == 0:
-            return "Unknown", 1.0, None
+            return [("Unknown", 1.0, None)] * len(embeddings)
 
-        # Calculate L2 distances (Euclidean norm)
-        distances = np.linalg.norm(
-            np.array(self.known_encodings) - embedding, axis=1
-        )
-        min_distance_idx = np.argmin(distances)
-        min_distance = distances[min_distance_idx]
-
-        # Check against threshold
-        if min_distance < self.config.RECOGNITION_THRESHOLD:
-            return (
-                self.known_names[min_distance_idx],
-                min_distance,
-                self.known_ids[min_distance_idx]
-            )
+        if self._index is not None:
+            # FAISS L2 indexes return squared distances
+            D, I = self._index.search(embeddings, 1)
+            idx = I[:, 0]
+            best_d2 = D[:, 0]
         else:
-            return "Unknown", min_distance, None
+            # Squared L2 via ||g||^2 - 2 e.g + ||e||^2: a single (F, N) GEMM
+            # instead of one gallery-sized subtraction per face
+            d2 = self._gallery_sq - 2.0 * (embeddings @ self._gallery.T)
+            d2 += np.einsum('ij,ij->i', embeddings, embeddings)[:, None]
+            idx = d2.argmin(axis=1)
+            best_d2 = np.maximum(d2[np.arange(len(idx)), idx], 0.0)
+
+        # Branchless match: out-of-threshold winners map to the "Unknown" slot
+        slots = np.where(best_d2 < self._thr_sq, idx, len(self.known_ids)).tolist()
+
+        # Only the winners are converted back to Euclidean distances
+        distances = np.sqrt(best_d2)
+        return [
+            (self._lookup_names[slot], distance, self._lookup_ids[slot])
+            for slot, distance in zip(slots, distances)
+        ]
 
     def capture_frame(self) -> np.ndarray:
         """Capture a single frame from the camera"""
@@ -192,6 +459,18 @@ class FaceRecognitionService:
             print(f"[ERROR] Failed to capture frame: {e}")
             return None
 
+    def encode_jpeg(self, frame: np.ndarray) -> Optional[bytes]:
+        """
+        Encode a BGR frame as JPEG for the MJPEG streams
+
+        Returns:
+            JPEG bytes, or None if encoding failed
+        """
+        if self._jpeg is not None:
+            return self._jpeg.encode(frame, quality=self.config.JPEG_QUALITY, pixel_format=TJPF_BGR)
+        ret, buffer = cv2.imencode('.jpg', frame, self._jpeg_params)
+        return buffer.tobytes() if ret else None
+
     def process_frame(self, frame: np.ndarray,
                      detect_faces: bool = True) -> Tuple[np.ndarray, List[dict]]:
         """
@@ -205,24 +484,32 @@ class FaceRecognitionService:
             Tuple of (annotated_frame, detections_list)
             detections_list contains dicts with keys: name, distance, bbox, student_db_id
         """
+        # Nobody is watching: skip detection (the most expensive step) entirely
+        if not self._has_consumer.is_set():
+            return frame, []
+
         detections = []
 
         # Only detect faces every N frames for performance
+        # Faces are matched once per detection and the results are reused
+        # on the frames in between
         if detect_faces and self.frame_counter % self.process_every == 0:
-            self.last_faces = self.app.get(frame)
+            faces = self.app.get(frame)
+            if faces:
+                embeddings = np.ascontiguousarray(
+                    np.stack([face.embedding for face in faces]), dtype=np.float32
+                )
+                self.last_faces = [
+                    (tuple(face.bbox.astype(np.int32).tolist()), *match)
+                    for face, match in zip(faces, self.recognize_faces(embeddings))
+                ]
+            else:
+                self.last_faces = []
 
         self.frame_counter += 1
 
         # Process detected faces
-        for face in self.last_faces:
-            # Get bounding box
-            bbox = face.bbox.astype(int)
-            x1, y1, x2, y2 = bbox
-
-            # Get embedding and recognize
-            embedding = face.embedding
-            name, distance, student_db_id = self.recognize_face(embedding)
-
+        for (x1, y1, x2, y2), name, distance, student_db_id in self.last_faces:
             # Store detection
             detections.append({
                 'name': name,
@@ -244,11 +531,12 @@ class FaceRecognitionService:
 
         # Calculate and display FPS
         self.frame_count += 1
-        elapsed_time = time.time() - self.start_time
+        now = time.monotonic()
+        elapsed_time = now - self.start_time
         if elapsed_time > 1:
             self.fps = self.frame_count / elapsed_time
             self.frame_count = 0
-            self.start_time = time.time()
+            self.start_time = now
 
         # Display FPS
         cv2.putText(frame, f"FPS: {self.fps:.1f}",
@@ -269,13 +557,15 @@ class FaceRecognitionService:
         Yields JPEG frames for Flask streaming response
 
         Args:
-            session_id: Active session ID for attendance marking
+            session_id: Session to mark attendance in; when None, the active
+                session is looked up for each detection batch (cached by
+                DatabaseManager), so sessions started or ended mid-stream apply
             auto_mark_attendance: Whether to automatically mark attendance
         """
         self.start_camera()
         self.start_recognition_stream()
 
-        # Track recent detections to prevent spam
+        # Track recent detections to prevent spam ((session_id, student_db_id) -> monotonic time)
         recent_detections = {}
 
         # Error recovery tracking
@@ -301,54 +591,55 @@ class FaceRecognitionService:
                 annotated_frame, detections = self.process_frame(frame)
 
                 # Auto-mark attendance if enabled and session is active
-                if auto_mark_attendance and session_id and len(detections) > 0:
-                    print(f"[DEBUG] Auto-mark enabled, session_id={session_id}, detections={len(detections)}")
+                mark_session_id = session_id
+                if auto_mark_attendance and mark_session_id is None and len(detections) > 0:
+                    mark_session_id = DatabaseManager.get_active_session_id()
+                if auto_mark_attendance and mark_session_id and len(detections) > 0:
+                    logger.debug("Auto-mark enabled, session_id=%s, detections=%d", mark_session_id, len(detections))
                     for detection in detections:
-                        print(f"[DEBUG] Detection: name={detection['name']}, db_id={detection['student_db_id']}, distance={detection['distance']:.3f}")
+                        logger.debug("Detection: name=%s, db_id=%s, distance=%.3f",
+                                     detection['name'], detection['student_db_id'], detection['distance'])
                         if detection['name'] != "Unknown" and detection['student_db_id']:
                             student_db_id = detection['student_db_id']
+                            recent_key = (mark_session_id, student_db_id)
 
                             # Check if we've recently marked this student
-                            last_marked = recent_detections.get(student_db_id)
-                            now = datetime.utcnow()
+                            last_marked = recent_detections.get(recent_key)
+                            now = time.monotonic()
 
-                            if not last_marked or \
-                               (now - last_marked).total_seconds() > 30:  # 30 second local cooldown
-                                print(f"[DEBUG] Attempting to mark attendance for student_db_id={student_db_id}")
+                            if last_marked is None or \
+                               now - last_marked > 30:  # 30 second local cooldown
+                                logger.debug("Attempting to mark attendance for student_db_id=%s", student_db_id)
                                 # Mark attendance
                                 try:
                                     record = DatabaseManager.mark_attendance(
-                                        session_id=session_id,
+                                        session_id=mark_session_id,
                                         student_db_id=student_db_id,
                                         confidence_score=detection['confidence_score'],
                                         cooldown_minutes=self.config.ATTENDANCE_COOLDOWN_MINUTES
                                     )
 
                                     if record:
-                                        recent_detections[student_db_id] = now
+                                        recent_detections[recent_key] = now
                                         print(f"[INFO] ✓ Attendance marked: {detection['name']} "
                                               f"(confidence: {detection['confidence_score']:.2f})")
                                     else:
                                         print(f"[INFO] Attendance already marked recently for {detection['name']}")
                                 except Exception as db_error:
-                                    print(f"[ERROR] Database error marking attendance: {db_error}")
-                                    import traceback
-                                    traceback.print_exc()
+                                    logger.exception("Database error marking attendance: %s", db_error)
                                     # Continue streaming even if DB fails
                             else:
-                                time_since_last = (now - last_marked).total_seconds()
-                                print(f"[DEBUG] Skipping {detection['name']} - marked {time_since_last:.0f}s ago")
+                                logger.debug("Skipping %s - marked %.0fs ago", detection['name'], now - last_marked)
                 else:
                     if not auto_mark_attendance:
-                        print("[DEBUG] Auto-mark disabled")
-                    if not session_id:
-                        print("[DEBUG] No active session")
+                        logger.debug("Auto-mark disabled")
+                    if not mark_session_id:
+                        logger.debug("No active session")
 
                 # Encode frame as JPEG with quality setting
-                encode_params = [cv2.IMWRITE_JPEG_QUALITY, 85]
-                ret, buffer = cv2.imencode('.jpg', annotated_frame, encode_params)
+                frame_bytes = self.encode_jpeg(annotated_frame)
 
-                if not ret:
+                if frame_bytes is None:
                     print("[WARNING] Failed to encode frame")
                     consecutive_errors += 1
                     if consecutive_errors >= max_consecutive_errors:
@@ -356,8 +647,6 @@ class FaceRecognitionService:
                         break
                     continue
 
-                frame_bytes = buffer.tobytes()
-
                 # Reset error counter on success
                 consecutive_errors = 0
 
@@ -367,8 +656,8 @@ class FaceRecognitionService:
                     break
 
                 # Yield frame in multipart format
-                yield (b'--frame\r\n'
-                       b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
+                yield b''.join((MJPEG_PART_HEADER, str(len(frame_bytes)).encode(),
+                                 MJPEG_HEADER_END, frame_bytes, MJPEG_PART_END))
 
                 # Check flag after yield (in case it was set while we were blocked)
                 if not self.is_recognition_streaming():
@@ -398,6 +687,30 @@ class FaceRecognitionService:
         self.stop_recognition_stream()
         self.stop_camera()
 
+    def _recognition_parts(self, flask_app: Flask, auto_mark_attendance: bool):
+        """generate_frames() in an app context, for the producer thread"""
+        with flask_app.app_context():
+            for part in self.generate_frames(auto_mark_attendance=auto_mark_attendance):
+                # Hand any connection used to mark attendance back to the pool
+                db.session.remove()
+                yield part
+
+    def recognition_frames(self, flask_app: Flask, auto_mark_attendance: bool = True):
+        """
+        MJPEG parts of the shared recognition stream, for one viewer
+
+        The first viewer starts a producer thread that runs generate_frames()
+        (capture, recognition, attendance marking, encoding); every viewer
+        is sent the latest part, so extra viewers cost a socket write each
+        rather than another recognition loop on the same camera. Attendance
+        goes to whichever session is active when a face is recognized, not
+        when the producer started. The stream stops when the last viewer
+        disconnects or stop_recognition_stream() is called.
+        """
+        return self._recognition_broadcast.frames(
+            lambda: self._recognition_parts(flask_app, auto_mark_attendance)
+        )
+
     def run_recognition_loop(self, session_id: Optional[int] = None,
                            auto_mark_attendance: bool = True,
                            display: bool = True):
@@ -410,9 +723,10 @@ class FaceRecognitionService:
             display: Whether to display the video feed (deprecated for headless mode)
         """
         self.start_camera()
+        self.start_recognition_stream()
         print("[INFO] Starting recognition loop... Press 'q' to quit")
 
-        # Track recent detections to prevent spam
+        # Track recent detections to prevent spam (student_db_id -> monotonic time)
         recent_detections = {}
 
         try:
@@ -431,10 +745,10 @@ class FaceRecognitionService:
 
                             # Check if we've recently marked this student
                             last_marked = recent_detections.get(student_db_id)
-                            now = datetime.utcnow()
+                            now = time.monotonic()
 
-                            if not last_marked or \
-                               (now - last_marked).total_seconds() > 30:  # 30 second local cooldown
+                            if last_marked is None or \
+                               now - last_marked > 30:  # 30 second local cooldown
                                 # Mark attendance
                                 record = DatabaseManager.mark_attendance(
                                     session_id=session_id,
@@ -453,8 +767,48 @@ class FaceRecognitionService:
                 time.sleep(0.03)  # ~30 FPS
 
         finally:
+            self.stop_recognition_stream()
             self.stop_camera()
 
+    def _save_photo(self, save_path: str, frame: np.ndarray) -> bool:
+        """Write an enrollment photo to disk (runs on the I/O pool)"""
+        if not cv2.imwrite(save_path, frame):
+            raise IOError(f"cv2.imwrite could not write {save_path}")
+        print(f"[INFO] Photo saved: {save_path}")
+        return True
+
+    def _save_photo_async(self, save_path: str, frame: np.ndarray):
+        """Queue an enrollment photo write; photo_saved() reports whether it landed"""
+        future = self._io_pool.submit(self._save_photo, save_path, frame)
+        with self._photo_writes_lock:
+            self._photo_writes[save_path] = future
+        future.add_done_callback(lambda done: self._photo_written(save_path, done))
+
+    def _photo_written(self, save_path: str, future):
+        """Done-callback for photo writes: log failures, forget successes"""
+        error = future.exception()
+        if error is not None:
+            logger.error("Failed to save enrollment photo %s: %s", save_path, error)
+            return
+        with self._photo_writes_lock:
+            if self._photo_writes.get(save_path) is future:
+                del self._photo_writes[save_path]
+
+    def photo_saved(self, save_path: str) -> bool:
+        """
+        Whether an enrollment photo reached the disk, waiting for its write if still queued
+
+        Callers should check this before storing save_path in the database.
+        """
+        with self._photo_writes_lock:
+            future = self._photo_writes.pop(save_path, None)
+        if future is None:
+            return True  # Already written (failed writes stay tracked until checked)
+        try:
+            return future.result()
+        except Exception:
+            return False
+
     def capture_enrollment_photo(self, person_name: str,
                                  save_path: str) -> Tuple[bool, Optional[np.ndarray]]:
         """
@@ -494,9 +848,8 @@ class FaceRecognitionService:
             cv2.putText(frame, person_name, (x1, y1 - 10),
                        cv2.FONT_HERSHEY_SIMPLEX, 0.9, (0, 255, 0), 2)
 
-            # Save image
-            cv2.imwrite(save_path, frame)
-            print(f"[INFO] Photo saved: {save_path}")
+            # Save image in the background
+            self._save_photo_async(save_path, frame)
 
             return True, embedding
 
@@ -565,16 +918,14 @@ class FaceRecognitionService:
             cv2.putText(frame, label, (x1 + 6, y1 - 6),
                        cv2.FONT_HERSHEY_DUPLEX, 0.6, (255, 255, 255), 1)
 
-            # Save image
-            cv2.imwrite(save_path, frame)
-            print(f"[INFO] Photo saved: {save_path} (Quality: {quality_score:.2f})")
+            # Save image in the background; the embedding is all the caller needs now
+            self._save_photo_async(save_path, frame)
+            print(f"[INFO] Photo captured: {save_path} (Quality: {quality_score:.2f})")
 
             return True, embedding, quality_score
 
         except Exception as e:
-            print(f"[ERROR] Failed to capture photo: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.exception("Failed to capture photo: %s", e)
             return False, None, 0.0
 
     def generate_enrollment_preview(self):
@@ -650,10 +1001,9 @@ class FaceRecognitionService:
                                cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
 
                     # Encode frame as JPEG
-                    encode_params = [cv2.IMWRITE_JPEG_QUALITY, 85]
-                    ret, buffer = cv2.imencode('.jpg', frame, encode_params)
+                    frame_bytes = self.encode_jpeg(frame)
 
-                    if not ret:
+                    if frame_bytes is None:
                         print("[WARNING] Failed to encode frame")
                         consecutive_errors += 1
                         if consecutive_errors >= max_consecutive_errors:
@@ -661,14 +1011,12 @@ class FaceRecognitionService:
                             break
                         continue
 
-                    frame_bytes = buffer.tobytes()
-
                     # Reset error counter on success
                     consecutive_errors = 0
 
                     # Yield frame in multipart format
-                    yield (b'--frame\r\n'
-                           b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
+                    yield b''.join((MJPEG_PART_HEADER, str(len(frame_bytes)).encode(),
+                                     MJPEG_HEADER_END, frame_bytes, MJPEG_PART_END))
 
                     # Control frame rate
                     time.sleep(0.033)  # ~30 FPS
@@ -692,9 +1040,26 @@ class FaceRecognitionService:
             self.stop_enrollment_stream()
             self.stop_camera()
 
+    def _enrollment_preview_parts(self, flask_app: Flask):
+        """generate_enrollment_preview() in an app context, for the producer thread"""
+        with flask_app.app_context():
+            yield from self.generate_enrollment_preview()
+
+    def enrollment_preview_frames(self, flask_app: Flask):
+        """
+        MJPEG parts of the enrollment preview, for one viewer
+
+        Detection, overlay drawing and JPEG encoding run on a producer thread
+        (see FrameBroadcast), so the request thread only relays parts. The
+        preview stops when the last viewer disconnects or
+        stop_enrollment_stream() is called.
+        """
+        return self._preview_broadcast.frames(lambda: self._enrollment_preview_parts(flask_app))
+
     def cleanup(self):
         """Cleanup resources"""
         self.stop_camera()
+        self._io_pool.shutdown(wait=True)  # Finish pending photo writes
         cv2.destroyAllWindows()
         # Pop app context if we created one
         if self.app_context:
@@ -2,181 +2,517 @@
 API Routes for Face Attendance System
 RESTful API endpoints for the application
 """
-from flask import Blueprint, request, jsonify, current_app, Response
+from flask import Blueprint, request, jsonify, current_app, Response, stream_with_context, abort, g
 from datetime import datetime, timedelta
+from collections import defaultdict
+from functools import lru_cache
+from sqlalchemy import func, literal, select
+from sqlalchemy.exc import IntegrityError
+from werkzeug.exceptions import HTTPException
+from sqlalchemy.orm import Session, joinedload, load_only, raiseload, undefer
 from models import db, Student, AttendanceSession, AttendanceRecord, SystemConfig
 from database import DatabaseManager
-from google_sheets_service import create_and_export_attendance_report, create_excel_only_report
+from google_sheets_service import create_attendance_report
 from email_service import send_attendance_report_email
-import traceback
+from utils import cache_headers, content_etag, json_bytes, not_modified, parse_datetime
+from routes.web import invalidate_dashboard_cache
+import schemas
+
+try:
+    from recognition_service import FaceRecognitionService  # Needs the camera/model libraries
+except ImportError:
+    FaceRecognitionService = None
+import logging
+import re
+import threading
+import time
 import os
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 
 api_bp = Blueprint('api', __name__)
+logger = logging.getLogger(__name__)
+
+# Guards the one-time creation of the app's recognition service
+_recognition_lock = threading.Lock()
+
+# Guards the in-progress enrollments and their buffered encodings in app.extensions
+_enrollment_lock = threading.Lock()
+
+# End-of-session reports are generated and emailed one at a time off the request thread
+REPORT_JOBS_KEPT = 100
+_report_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix='session-report')
+_report_jobs_lock = threading.Lock()
+
+# Unique constraint violations reported back to the client as 400s, keyed by column
+INTEGRITY_ERROR_MESSAGES = {
+    'email': 'This email address is already in use by another student',
+    'student_id': 'A student with this ID already exists',
+}
+
+# Where each driver names the violated constraint: SQLite ("UNIQUE constraint
+# failed: students.email"), PostgreSQL ('unique constraint "students_email_key"')
+# and MySQL ("Duplicate entry 'x' for key 'students.email'")
+UNIQUE_VIOLATION_PATTERN = re.compile(
+    r"UNIQUE constraint failed: ([\w.]+)|unique constraint \"(\w+)\"|for key '([\w.]+)'"
+)
+
+
+def violated_unique_column(error):
+    """Column of INTEGRITY_ERROR_MESSAGES behind an IntegrityError, or None"""
+    diag = getattr(error.orig, 'diag', None)  # psycopg reports the constraint directly
+    constraint = getattr(diag, 'constraint_name', None)
+    if constraint is None:
+        match = UNIQUE_VIOLATION_PATTERN.search(str(error.orig))
+        if match is None:
+            return None
+        constraint = next(name for name in match.groups() if name)
+    # Constraint/index names embed the column: students.email, students_email_key, ix_students_student_id
+    for column in INTEGRITY_ERROR_MESSAGES:
+        if re.search(rf'(^|[._]){column}($|[._])', constraint):
+            return column
+    return None
+
+
+@lru_cache(maxsize=256)
+def error_body(message):
+    """Serialized API error body, built once per distinct message"""
+    return json_bytes({
+        'success': False,
+        'error': message
+    })
+
+
+def error_response(message, code):
+    """Fresh JSON error response around the cached body"""
+    return Response(error_body(message), code, mimetype='application/json')
+
+
+# 404/500 are listed explicitly because the app's per-code handlers would win otherwise
+@api_bp.errorhandler(HTTPException)
+@api_bp.errorhandler(404)
+@api_bp.errorhandler(500)
+def handle_http_error(error):
+    """Return abort() errors in the API's JSON error shape"""
+    return error_response(error.description, error.code)
+
+
+@api_bp.errorhandler(IntegrityError)
+def handle_integrity_error(error):
+    """Turn known unique constraint violations into client errors"""
+    db.session.rollback()
+    column = violated_unique_column(error)
+    if column is not None:
+        return error_response(INTEGRITY_ERROR_MESSAGES[column], 400)
+    return handle_unexpected_error(error)
+
+
+@api_bp.errorhandler(Exception)
+def handle_unexpected_error(error):
+    """Log unexpected errors and return a generic 500 without internals"""
+    db.session.rollback()
+    logger.error("%s %s failed: %s", request.method, request.path, error, exc_info=error)
+    return error_response('Internal server error', 500)
+
+
+# Pagination for list endpoints
+DEFAULT_PAGE_SIZE = 64
+MAX_PAGE_SIZE = 500
+
+
+def get_pagination_args():
+    """
+    Read pagination query parameters
+
+    Accepts page/page_size, with the older limit parameter treated as a
+    page_size alias. Page size is clamped to MAX_PAGE_SIZE. An explicit
+    offset takes precedence over page.
+
+    Returns:
+        Tuple of (page, page_size, offset, include_total)
+    """
+    page = max(request.args.get('page', 1, type=int), 1)
+    page_size = (request.args.get('page_size', type=int)
+                 or request.args.get('limit', type=int)
+                 or DEFAULT_PAGE_SIZE)
+    page_size = min(max(page_size, 1), MAX_PAGE_SIZE)
+    offset = request.args.get('offset', type=int)
+    offset = (page - 1) * page_size if offset is None else max(offset, 0)
+    include_total = request.args.get('include_total', '0').lower() in ('1', 'true')
+    return page, page_size, offset, include_total
+
+
+def count_rows(stmt, column):
+    """Run a COUNT over a filtered SELECT without its ORDER BY"""
+    return db.session.scalar(stmt.order_by(None).with_only_columns(func.count(column)))
+
+
+def model_fields(model):
+    """Column names a client may select via ?fields= (cached on the model class)"""
+    fields = model.__dict__.get('_api_fields')
+    if fields is None:
+        fields = frozenset(model.__table__.columns.keys())
+        model._api_fields = fields
+    return fields
+
+
+def get_fields_arg(model):
+    """
+    Parse the sparse fieldset parameter (?fields=id,name,...)
+
+    Returns:
+        Tuple of (fields, unknown) where fields is None when the parameter
+        is absent, and unknown lists requested names that are not columns
+    """
+    fields = set(request.args.get('fields', '').split(',')) - {''}
+    if not fields:
+        return None, []
+    return fields, sorted(fields - model_fields(model))
+
+
+def load_fields(model, fields):
+    """Loader option that SELECTs only the requested columns"""
+    return load_only(*[getattr(model, field) for field in fields])
+
+
+def current_active_session():
+    """Active session for the current request, looked up at most once per request"""
+    if 'active_session' not in g:
+        g.active_session = DatabaseManager.get_active_session()
+    return g.active_session
+
+
+# Seconds that /status and /recognition/status may serve cached DB aggregates
+STATUS_CACHE_TTL = 5
+
+
+@lru_cache(maxsize=1)
+def _cached_status(time_bucket):
+    """
+    DB-backed part of the status endpoints, memoized per STATUS_CACHE_TTL bucket
+
+    Holds only plain values (no ORM instances) so it is safe to share
+    across requests.
+    """
+    # One round trip: the three counts as scalar subqueries, plus the active
+    # session (with its record count) outer-joined onto a single-row FROM so
+    # the row exists even when no session is active
+    one_row = select(literal(1).label('one')).subquery()
+    total_students, total_sessions, total_records, active_session = db.session.execute(
+        select(
+            select(func.count(Student.id)).filter_by(status='active').scalar_subquery(),
+            select(func.count(AttendanceSession.id)).correlate(None).scalar_subquery(),
+            select(func.count(AttendanceRecord.id)).scalar_subquery(),
+            AttendanceSession
+        )
+        .select_from(one_row)
+        .outerjoin(AttendanceSession, AttendanceSession.status == 'active')
+        .options(undefer(AttendanceSession.attendance_count))
+        .limit(1)
+    ).one()
+
+    return {
+        'total_students': total_students,
+        'total_sessions': total_sessions,
+        'total_attendance_records': total_records,
+        'active_session': active_session.to_dict() if active_session else None
+    }
+
+
+@lru_cache(maxsize=1)
+def _cached_status_etag(time_bucket):
+    """ETag of the cached status aggregates, hashed once per cache bucket"""
+    return content_etag(json_bytes(_cached_status(time_bucket)))
+
+
+def get_cached_status():
+    """Return status aggregates, at most STATUS_CACHE_TTL seconds old"""
+    return _cached_status(int(time.monotonic() // STATUS_CACHE_TTL))
+
+
+def get_cached_status_etag():
+    """Return the ETag matching get_cached_status()"""
+    return _cached_status_etag(int(time.monotonic() // STATUS_CACHE_TTL))
+
+
+def invalidate_status_cache():
+    """Drop cached status aggregates after a write that changes them"""
+    _cached_status.cache_clear()
+    _cached_status_etag.cache_clear()
+    invalidate_dashboard_cache()
+    g.pop('active_session', None)
+
+
+def state_etag(stmt, *state_columns):
+    """
+    ETag for a list from cheap aggregates over the SELECT's rows
+
+    Runs `stmt` with only `state_columns` (e.g. COUNT and MAX(updated_at))
+    and hashes the result together with the query string, so the ETag can
+    be checked before the list itself is loaded.
+
+    Returns:
+        Tuple of (etag, state row)
+    """
+    state = db.session.execute(stmt.order_by(None).with_only_columns(*state_columns)).one()
+    return content_etag(repr(tuple(state)).encode() + b'?' + request.query_string), state
+
+
+def conditional_json(payload, etag=None, max_age=None):
+    """
+    JSON response with an ETag, or an empty 304 if the client already has it
+
+    Args:
+        payload: Response data
+        etag: Precomputed ETag; when omitted the serialized body is hashed
+        max_age: Seconds the client may reuse the response without asking.
+            When None the client must revalidate every time (no-cache).
+    """
+    body = None
+    if etag is None:
+        body = json_bytes(payload)
+        etag = content_etag(body)
+
+    response = not_modified(etag, max_age)
+    if response is not None:
+        return response
+
+    if body is None:
+        body = json_bytes(payload)
+    return cache_headers(current_app.response_class(body, mimetype='application/json'), etag, max_age)
 
-# Global reference to recognition service (initialized when streaming starts)
-recognition_service = None
+
+def get_json_body(validate):
+    """Parse the JSON request body with a schemas validator, aborting with 400 if invalid"""
+    try:
+        return validate(request.get_json(silent=True))
+    except ValueError as e:
+        abort(400, str(e))
+
+
+def get_datetime_arg(name):
+    """
+    Parse an optional ISO 8601 query parameter, aborting with 400 if it is malformed
+
+    Returns:
+        The datetime, or None if the parameter is absent
+    """
+    value = request.args.get(name)
+    if not value:
+        return None
+    try:
+        return parse_datetime(value)
+    except ValueError:
+        abort(400, f'Invalid {name}. Use ISO 8601 (YYYY-MM-DD or YYYY-MM-DDTHH:MM:SS)')
+
+
+def project(obj, fields):
+    """Serialize only the requested columns of a model instance"""
+    result = {}
+    for field in fields:
+        value = getattr(obj, field)
+        result[field] = value.isoformat() if isinstance(value, datetime) else value
+    return result
+
+
+def row_dict(row):
+    """Serialize a Core result mapping the way to_dict() would (ISO 8601 datetimes)"""
+    return {key: value.isoformat() if isinstance(value, datetime) else value for key, value in row.items()}
+
+
+# Database ID -> (updated_at, serialized row); an update changes updated_at and misses
+STUDENT_JSON_CACHE_SIZE = 4096
+_student_json_cache = {}
+
+
+def student_rows_json(stmt):
+    """
+    Serialized rows for a SELECT of the full students table, in its order
+
+    Only (id, updated_at) is read for every row; rows missing from the cache,
+    or changed since they were cached, are loaded and serialized in one query.
+    """
+    keys = db.session.execute(stmt.with_only_columns(Student.id, Student.updated_at)).all()
+    serialized = {}
+    for student_id, updated_at in keys:
+        cached = _student_json_cache.get(student_id)
+        if cached is not None and cached[0] == updated_at:
+            serialized[student_id] = cached[1]
+
+    missing = [student_id for student_id, _ in keys if student_id not in serialized]
+    if missing:
+        if len(_student_json_cache) + len(missing) > STUDENT_JSON_CACHE_SIZE:
+            _student_json_cache.clear()
+        rows = db.session.execute(select(Student.__table__).where(Student.id.in_(missing))).mappings()
+        for row in rows:
+            serialized[row['id']] = row_json = json_bytes(row_dict(row))
+            _student_json_cache[row['id']] = (row['updated_at'], row_json)
+
+    # A row deleted between the two queries is left out
+    return [serialized[student_id] for student_id, _ in keys if student_id in serialized]
+
+
+# Rows fetched per DB round trip / serialized per chunk when streaming lists
+STREAM_BATCH_SIZE = 100
+
+
+def stream_json_list(key, stmt, serialize, meta):
+    """
+    Stream the rows of a SELECT as a JSON object whose `key` holds a list
+
+    Emits the keys of `meta` first, then the rows one yield_per batch at a
+    time (one serializer call per batch), then a trailing count, so rows never
+    have to be materialized as one list. The statement runs and its first
+    batch is serialized before the response starts, so a failing query still
+    gets the usual JSON error; a failure after that is logged and closes the
+    document with an "error" key next to the count of rows sent.
+
+    Flask tears down the app context, and with it db.session, before the
+    body is streamed, so the rows are read through a session of their own
+    that is closed with the response.
+    """
+    session = Session(db.engine)
+    try:
+        partitions = session.scalars(stmt.execution_options(yield_per=STREAM_BATCH_SIZE)).partitions()
+        first = next(partitions, [])
+        # One serializer call per batch; strip the list brackets so batches
+        # concatenate into a single array
+        head = json_bytes(meta).rstrip()[:-1] + f',"{key}":['.encode()
+        head += json_bytes([serialize(item) for item in first]).strip()[1:-1]
+    except Exception:
+        session.close()
+        raise
+
+    def generate():
+        yield head
+        count = len(first)
+        try:
+            for partition in partitions:
+                yield (b',' if count else b'') + json_bytes([serialize(item) for item in partition]).strip()[1:-1]
+                count += len(partition)
+        except Exception as error:
+            logger.error("%s %s failed after streaming %d rows: %s",
+                         request.method, request.path, count, error, exc_info=error)
+            yield f'],"count":{count},"error":"Internal server error"}}'.encode()
+            return
+        yield f'],"count":{count}}}'.encode()
+
+    response = Response(stream_with_context(generate()), mimetype='application/json')
+    response.call_on_close(session.close)
+    return response
 
 # Student Management Endpoints
 
 @api_bp.route('/students', methods=['GET']) 
 def get_students():
     """Get all students"""
-    try:
-        status = request.args.get('status', 'active')
-        students = DatabaseManager.get_all_students(status)
-        return jsonify({
-            'success': True,
-            'count': len(students),
-            'students': [student.to_dict() for student in students]
-        }), 200
-    except Exception as e:
-        return jsonify({
-            'success': False,
-            'error': str(e)
-        }), 500
+    status = request.args.get('status', 'active')
+    page, page_size, offset, include_total = get_pagination_args()
+    fields, unknown = get_fields_arg(Student)
+    if unknown:
+        abort(400, f'Unknown fields: {", ".join(unknown)}')
+
+    # Plain column rows rather than ORM instances; to_dict() is exactly the table's columns
+    columns = Student.__table__.c
+    stmt = select(*([columns[field] for field in fields] if fields else columns))
+    if status:
+        stmt = stmt.filter_by(status=status)
+
+    # Any insert, update or delete changes the row count or the latest updated_at
+    etag, (total, _) = state_etag(stmt, func.count(Student.id), func.max(Student.updated_at))
+    response = not_modified(etag)
+    if response is not None:
+        return response
+
+    stmt = stmt.order_by(Student.id).offset(offset).limit(page_size)
+    if fields:
+        students_json = [json_bytes(row_dict(row)) for row in db.session.execute(stmt).mappings()]
+    else:
+        students_json = student_rows_json(stmt)
+
+    response = {
+        'success': True,
+        'count': len(students_json),
+        'page': page,
+        'page_size': page_size
+    }
+    if include_total:
+        response['total'] = total
+
+    # Splice the serialized rows in rather than re-encoding them
+    body = json_bytes(response).rstrip()[:-1] + b',"students":[' + b','.join(students_json) + b']}'
+    return cache_headers(current_app.response_class(body, mimetype='application/json'), etag)
 
 @api_bp.route('/students/<path:student_id>', methods=['GET'])
 def get_student(student_id):
     """Get a specific student"""
-    try:
-        student = DatabaseManager.get_student_by_id(student_id)
-        if not student:
-            return jsonify({
-                'success': False,
-                'error': 'Student not found'
-            }), 404
+    student = DatabaseManager.get_student_by_id(student_id)
+    if not student:
+        abort(404, 'Student not found')
 
-        return jsonify({
-            'success': True,
-            'student': student.to_dict()
-        }), 200
-    except Exception as e:
-        return jsonify({
-            'success': False,
-            'error': str(e)
-        }), 500
+    return jsonify({
+        'success': True,
+        'student': student.to_dict()
+    }), 200
 
 @api_bp.route('/students', methods=['POST'])
 def create_student():
     """Create a new student"""
-    try:
-        data = request.get_json()
-
-        if not data.get('student_id') or not data.get('name'):
-            return jsonify({
-                'success': False,
-                'error': 'student_id and name are required'
-            }), 400
-
-        # Check if student already exists
-        existing = DatabaseManager.get_student_by_id(data['student_id'])
-        if existing:
-            return jsonify({
-                'success': False,
-                'error': 'Student with this ID already exists'
-            }), 400
-
-        # Check if email is already in use
-        if data.get('email'):
-            existing_email = Student.query.filter_by(email=data['email']).first()
-            if existing_email:
-                return jsonify({
-                    'success': False,
-                    'error': f'Email {data["email"]} is already in use by another student'
-                }), 400
-
-        student = DatabaseManager.create_student(
-            student_id=data['student_id'],
-            name=data['name'],
-            email=data.get('email'),
-            phone=data.get('phone'),
-            program=data.get('program'),
-            year_of_study=data.get('year_of_study')
-        )
+    data = get_json_body(schemas.validate_create_student)
+
+    # Duplicate IDs/emails are caught by the unique constraints on insert,
+    # saving a SELECT round trip per check (see handle_integrity_error)
+    student = DatabaseManager.create_student(
+        student_id=data['student_id'],
+        name=data['name'],
+        email=data.get('email'),
+        phone=data.get('phone'),
+        program=data.get('program'),
+        year_of_study=data.get('year_of_study')
+    )
+    invalidate_status_cache()
 
-        return jsonify({
-            'success': True,
-            'message': 'Student created successfully',
-            'student': student.to_dict()
-        }), 201
-    except Exception as e:
-        # Handle database integrity errors
-        error_msg = str(e)
-        if 'UNIQUE constraint failed: students.email' in error_msg:
-            return jsonify({
-                'success': False,
-                'error': 'This email address is already in use by another student'
-            }), 400
-        elif 'UNIQUE constraint failed: students.student_id' in error_msg:
-            return jsonify({
-                'success': False,
-                'error': 'A student with this ID already exists'
-            }), 400
-        return jsonify({
-            'success': False,
-            'error': error_msg
-        }), 500
+    return jsonify({
+        'success': True,
+        'message': 'Student created successfully',
+        'student': student.to_summary_dict()
+    }), 201
 
 @api_bp.route('/students/<path:student_id>', methods=['PUT'])
 def update_student(student_id):
     """Update student information"""
-    try:
-        data = request.get_json()
-
-        # Check if email is being updated and if it's already in use by another student
-        if 'email' in data and data['email']:
-            existing_student = Student.query.filter_by(email=data['email']).first()
-            if existing_student and existing_student.student_id != student_id:
-                return jsonify({
-                    'success': False,
-                    'error': f'Email {data["email"]} is already in use by another student'
-                }), 400
-
-        student = DatabaseManager.update_student(student_id, **data)
-        if not student:
-            return jsonify({
-                'success': False,
-                'error': 'Student not found'
-            }), 404
+    data = request.get_json()
 
-        return jsonify({
-            'success': True,
-            'message': 'Student updated successfully',
-            'student': student.to_dict()
-        }), 200
-    except Exception as e:
-        # Handle database integrity errors
-        error_msg = str(e)
-        if 'UNIQUE constraint failed: students.email' in error_msg:
-            return jsonify({
-                'success': False,
-                'error': 'This email address is already in use by another student'
-            }), 400
-        return jsonify({
-            'success': False,
-            'error': error_msg
-        }), 500
+    # Check if email is being updated and if it's already in use by another student
+    if 'email' in data and data['email']:
+        existing_student = Student.query.filter_by(email=data['email']).first()
+        if existing_student and existing_student.student_id != student_id:
+            abort(400, f'Email {data["email"]} is already in use by another student')
+
+    student = DatabaseManager.update_student(student_id, **data)
+    if not student:
+        abort(404, 'Student not found')
+    invalidate_status_cache()
+
+    return jsonify({
+        'success': True,
+        'message': 'Student updated successfully',
+        'student': student.to_summary_dict()
+    }), 200
 
 @api_bp.route('/students/<path:student_id>', methods=['DELETE'])
 def delete_student(student_id):
     """Delete (deactivate) a student"""
-    try:
-        success = DatabaseManager.delete_student(student_id)
-        if not success:
-            return jsonify({
-                'success': False,
-                'error': 'Student not found'
-            }), 404
+    success = DatabaseManager.delete_student(student_id)
+    if not success:
+        abort(404, 'Student not found')
+    invalidate_status_cache()
+    end_enrollment(student_id)
 
-        return jsonify({
-            'success': True,
-            'message': 'Student deleted successfully'
-        }), 200
-    except Exception as e:
-        return jsonify({
-            'success': False,
-            'error': str(e)
-        }), 500
+    return jsonify({
+        'success': True,
+        'message': 'Student deleted successfully'
+    }), 200
 
 
 # Attendance Session Endpoints
@@ -185,417 +521,370 @@ def delete_student(student_id):
 @api_bp.route('/sessions', methods=['GET'])
 def get_sessions():
     """Get all attendance sessions"""
-    try:
-        status = request.args.get('status')
-        limit = request.args.get('limit', type=int)
-
-        query = AttendanceSession.query
-
-        if status:
-            query = query.filter_by(status=status)
-
-        query = query.order_by(AttendanceSession.start_time.desc())
-
-        if limit:
-            query = query.limit(limit)
-
-        sessions = query.all()
-
-        return jsonify({
-            'success': True,
-            'count': len(sessions),
-            'sessions': [session.to_dict() for session in sessions]
-        }), 200
-    except Exception as e:
-        return jsonify({
-            'success': False,
-            'error': str(e)
-        }), 500
+    status = request.args.get('status')
+    before = get_datetime_arg('before')  # Keyset cursor: start_time of the last row seen
+    page, page_size, offset, include_total = get_pagination_args()
+    fields, unknown = get_fields_arg(AttendanceSession)
+    if unknown:
+        abort(400, f'Unknown fields: {", ".join(unknown)}')
+
+    stmt = select(AttendanceSession)
+
+    if status:
+        stmt = stmt.filter_by(status=status)
+
+    # Sessions are only created and ended, and their counts change only as
+    # records are added or (via student deletion) removed
+    etag, (total, *_) = state_etag(
+        stmt,
+        func.count(AttendanceSession.id),
+        func.max(AttendanceSession.id),
+        func.max(AttendanceSession.end_time),
+        select(func.count(AttendanceRecord.id)).scalar_subquery(),
+        select(func.max(AttendanceRecord.id)).scalar_subquery()
+    )
+    response = not_modified(etag)
+    if response is not None:
+        return response
+
+    stmt = stmt.order_by(AttendanceSession.start_time.desc())
+
+    if before:
+        stmt = stmt.filter(AttendanceSession.start_time < before)
+    else:
+        stmt = stmt.offset(offset)
+
+    if fields:
+        stmt = stmt.options(load_fields(AttendanceSession, fields))
+        serialize = lambda session: project(session, fields)
+    else:
+        # to_dict() reports each session's record count; compute it in the same SELECT
+        stmt = stmt.options(undefer(AttendanceSession.attendance_count))
+        serialize = AttendanceSession.to_dict
+
+    meta = {
+        'success': True,
+        'page': page,
+        'page_size': page_size
+    }
+    if include_total:
+        meta['total'] = total
+
+    return cache_headers(stream_json_list('sessions', stmt.limit(page_size), serialize, meta), etag)
 
 @api_bp.route('/sessions/active', methods=['GET'])
 def get_active_session():
     """Get the currently active session"""
-    try:
-        session = DatabaseManager.get_active_session()
-        if not session:
-            return jsonify({
-                'success': False,
-                'error': 'No active session'
-            }), 404
+    session = current_active_session()
+    if not session:
+        abort(404, 'No active session')
 
-        return jsonify({
-            'success': True,
-            'session': session.to_dict()
-        }), 200
-    except Exception as e:
-        return jsonify({
-            'success': False,
-            'error': str(e)
-        }), 500
+    return jsonify({
+        'success': True,
+        'session': session.to_dict()
+    }), 200
 
 @api_bp.route('/sessions', methods=['POST'])
 def create_session():
     """Create a new attendance session"""
-    try:
-        data = request.get_json()
-
-        if not data.get('session_name'):
-            return jsonify({
-                'success': False,
-                'error': 'session_name is required'
-            }), 400
-
-        # Check if there's already an active session
-        active_session = DatabaseManager.get_active_session()
-        if active_session:
-            return jsonify({
-                'success': False,
-                'error': 'There is already an active session. Please end it first.',
-                'active_session': active_session.to_dict()
-            }), 400
-
-        session = DatabaseManager.create_attendance_session(
-            session_name=data['session_name'],
-            course_code=data.get('course_code'),
-            course_name=data.get('course_name'),
-            instructor_name=data.get('instructor_name'),
-            instructor_email=data.get('instructor_email'),
-            location=data.get('location')
-        )
+    data = get_json_body(schemas.validate_create_session)
 
-        return jsonify({
-            'success': True,
-            'message': 'Session created successfully',
-            'session': session.to_dict()
-        }), 201
-    except Exception as e:
+    # Check if there's already an active session
+    active_session = current_active_session()
+    if active_session:
         return jsonify({
             'success': False,
-            'error': str(e)
-        }), 500
+            'error': 'There is already an active session. Please end it first.',
+            'active_session': active_session.to_dict()
+        }), 400
+
+    session = DatabaseManager.create_attendance_session(
+        session_name=data['session_name'],
+        course_code=data.get('course_code'),
+        course_name=data.get('course_name'),
+        instructor_name=data.get('instructor_name'),
+        instructor_email=data.get('instructor_email'),
+        location=data.get('location')
+    )
+    invalidate_status_cache()
 
-@api_bp.route('/sessions/<int:session_id>/end', methods=['POST'])
-def end_session(session_id):
-    """End an attendance session"""
-    try:
-        session = DatabaseManager.end_session(session_id)
-        if not session:
-            return jsonify({
-                'success': False,
-                'error': 'Session not found'
-            }), 404
-
-        # Prepare response data
-        response_data = {
-            'success': True,
-            'message': 'Session ended successfully',
-            'session': session.to_dict()
-        }
+    return jsonify({
+        'success': True,
+        'message': 'Session created successfully',
+        'session': session.to_dict()
+    }), 201
 
-        # Attempt to send report if instructor email is provided
-        if session.instructor_email:
-            try:
-                print(f"[INFO] Generating attendance report for session {session_id}")
-
-                # Get attendance records for this session
-                attendance_records = DatabaseManager.get_session_attendance(session_id)
-
-                if not attendance_records:
-                    print(f"[WARNING] No attendance records found for session {session_id}")
-                    response_data['report_warning'] = 'No attendance records to send'
-                else:
-                    # Prepare session data
-                    session_dict = session.to_dict()
-
-                    # Prepare attendance records with student details
-                    records_data = []
-                    for record in attendance_records:
-                        record_dict = record.to_dict()
-                        if record.student:
-                            record_dict['student_email'] = record.student.email
-                            record_dict['student_program'] = record.student.program
-                        records_data.append(record_dict)
-
-                    # Create attendance report (tries Google Sheets, falls back to Excel-only)
-                    print(f"[INFO] Creating attendance report for session {session_id}")
-                    try:
-                        report_result = create_and_export_attendance_report(
-                            session_data=session_dict,
-                            attendance_records=records_data,
-                            output_dir='/tmp'
-                        )
-                        print(f"[INFO] Google Sheets report created successfully")
-                    except Exception:
-                        # Google Sheets failed (likely permission/quota issues), use Excel-only fallback
-                        print(f"[INFO] Using Excel-only export (Google Sheets unavailable)")
-                        report_result = create_excel_only_report(
-                            session_data=session_dict,
-                            attendance_records=records_data,
-                            output_dir='/tmp'
-                        )
-
-                    # Send email with attachment
-                    print(f"[INFO] Sending email to {session.instructor_email}")
-                    email_sent = send_attendance_report_email(
-                        recipient_email=session.instructor_email,
-                        session_data=session_dict,
-                        excel_path=report_result['excel_path'],
-                        spreadsheet_url=report_result.get('spreadsheet_url')
-                    )
-
-                    if email_sent:
-                        response_data['report_sent'] = True
-                        response_data['report_info'] = {
-                            'spreadsheet_url': report_result.get('spreadsheet_url'),
-                            'recipient': session.instructor_email
-                        }
-                        print(f"[INFO] Report sent successfully to {session.instructor_email}")
-                    else:
-                        response_data['report_sent'] = False
-                        response_data['report_error'] = 'Failed to send email'
-                        print(f"[ERROR] Failed to send email to {session.instructor_email}")
-
-                    # Clean up temporary Excel file
-                    try:
-                        if os.path.exists(report_result['excel_path']):
-                            os.remove(report_result['excel_path'])
-                            print(f"[INFO] Cleaned up temporary file: {report_result['excel_path']}")
-                    except Exception as cleanup_error:
-                        print(f"[WARNING] Failed to clean up temporary file: {cleanup_error}")
-
-            except Exception as report_error:
-                print(f"[ERROR] Failed to generate/send report: {report_error}")
-                traceback.print_exc()
-                response_data['report_sent'] = False
-                response_data['report_error'] = str(report_error)
-        else:
-            print(f"[INFO] No instructor email provided for session {session_id}")
-            response_data['report_sent'] = False
-            response_data['report_info'] = 'No instructor email provided'
+def generate_session_report(session_id):
+    """
+    Export a session's attendance report and email it to the instructor
 
-        return jsonify(response_data), 200
+    Returns:
+        The report_* fields describing the outcome
+    """
+    session = DatabaseManager.get_session_by_id(session_id)
+    result = {}
+    try:
+        print(f"[INFO] Generating attendance report for session {session_id}")
 
-    except Exception as e:
-        print(f"[ERROR] Failed to end session: {e}")
-        traceback.print_exc()
-        return jsonify({
-            'success': False,
-            'error': str(e)
-        }), 500
+        # Attendance records with student details for this session
+        records_data = DatabaseManager.get_session_report_records(session_id)
 
-@api_bp.route('/sessions/<int:session_id>/resend-report', methods=['POST'])
-def resend_report(session_id):
-    """Manually resend attendance report for a completed session"""
-    try:
-        # Get the session
-        session = DatabaseManager.get_session_by_id(session_id)
-        if not session:
-            return jsonify({
-                'success': False,
-                'error': 'Session not found'
-            }), 404
-
-        # Check if instructor email is provided
-        if not session.instructor_email:
-            return jsonify({
-                'success': False,
-                'error': 'No instructor email configured for this session'
-            }), 400
-
-        # Get attendance records
-        attendance_records = DatabaseManager.get_session_attendance(session_id)
-
-        if not attendance_records:
-            return jsonify({
-                'success': False,
-                'error': 'No attendance records found for this session'
-            }), 400
-
-        # Prepare session data
-        session_dict = session.to_dict()
-
-        # Prepare attendance records with student details
-        records_data = []
-        for record in attendance_records:
-            record_dict = record.to_dict()
-            if record.student:
-                record_dict['student_email'] = record.student.email
-                record_dict['student_program'] = record.student.program
-            records_data.append(record_dict)
-
-        # Create attendance report (tries Google Sheets, falls back to Excel-only)
-        print(f"[INFO] Creating attendance report for session {session_id} (manual resend)")
-        try:
-            report_result = create_and_export_attendance_report(
+        if not records_data:
+            print(f"[WARNING] No attendance records found for session {session_id}")
+            result['report_warning'] = 'No attendance records to send'
+        else:
+            # Prepare session data
+            session_dict = session.to_dict()
+
+            # Create attendance report (Google Sheets, or Excel-only if that fails or is slow)
+            print(f"[INFO] Creating attendance report for session {session_id}")
+            report_result = create_attendance_report(
                 session_data=session_dict,
-                attendance_records=records_data,
-                output_dir='/tmp'
+                attendance_records=records_data
             )
-            print(f"[INFO] Google Sheets report created successfully")
-        except Exception:
-            # Google Sheets failed (likely permission/quota issues), use Excel-only fallback
-            print(f"[INFO] Using Excel-only export (Google Sheets unavailable)")
-            report_result = create_excel_only_report(
+
+            # Send email with attachment
+            print(f"[INFO] Sending email to {session.instructor_email}")
+            email_sent = send_attendance_report_email(
+                recipient_email=session.instructor_email,
                 session_data=session_dict,
-                attendance_records=records_data,
-                output_dir='/tmp'
+                excel_bytes=report_result['excel_bytes'],
+                excel_filename=report_result['excel_filename'],
+                spreadsheet_url=report_result.get('spreadsheet_url')
             )
 
-        # Send email with attachment
-        print(f"[INFO] Sending email to {session.instructor_email} (manual resend)")
-        email_sent = send_attendance_report_email(
-            recipient_email=session.instructor_email,
-            session_data=session_dict,
-            excel_path=report_result['excel_path'],
-            spreadsheet_url=report_result.get('spreadsheet_url')
-        )
-
-        # Clean up temporary Excel file
-        try:
-            if os.path.exists(report_result['excel_path']):
-                os.remove(report_result['excel_path'])
-                print(f"[INFO] Cleaned up temporary file: {report_result['excel_path']}")
-        except Exception as cleanup_error:
-            print(f"[WARNING] Failed to clean up temporary file: {cleanup_error}")
-
-        if email_sent:
-            return jsonify({
-                'success': True,
-                'message': 'Report sent successfully',
-                'report_info': {
+            if email_sent:
+                result['report_sent'] = True
+                result['report_info'] = {
                     'spreadsheet_url': report_result.get('spreadsheet_url'),
-                    'recipient': session.instructor_email,
-                    'attendance_count': len(attendance_records)
+                    'recipient': session.instructor_email
                 }
-            }), 200
-        else:
-            return jsonify({
-                'success': False,
-                'error': 'Failed to send email. Check server logs for details.'
-            }), 500
-
-    except Exception as e:
-        print(f"[ERROR] Failed to resend report: {e}")
-        traceback.print_exc()
-        return jsonify({
-            'success': False,
-            'error': str(e)
-        }), 500
+                print(f"[INFO] Report sent successfully to {session.instructor_email}")
+            else:
+                result['report_sent'] = False
+                result['report_error'] = 'Failed to send email'
+                print(f"[ERROR] Failed to send email to {session.instructor_email}")
 
+    except Exception as report_error:
+        logger.exception("Failed to generate/send report: %s", report_error)
+        result['report_sent'] = False
+        result['report_error'] = str(report_error)
 
-# Attendance Record Endpoints
+    return result
 
 
-@api_bp.route('/attendance', methods=['GET'])
-def get_attendance():
-    """Get attendance records with optional filters"""
-    try:
-        session_id = request.args.get('session_id', type=int)
-        student_id = request.args.get('student_id')
-        start_date = request.args.get('start_date')
-        end_date = request.args.get('end_date')
-        limit = request.args.get('limit', type=int)
+def run_report_job(app, session_id):
+    """Report job body; runs on the report worker thread"""
+    with app.app_context():
+        return generate_session_report(session_id)
 
-        query = AttendanceRecord.query
 
-        if session_id:
-            query = query.filter_by(session_id=session_id)
+def report_jobs():
+    """Report job ID -> (session ID, future); only the latest REPORT_JOBS_KEPT are kept"""
+    return current_app.extensions.setdefault('report_jobs', {})
 
-        if student_id:
-            student = DatabaseManager.get_student_by_id(student_id)
-            if student:
-                query = query.filter_by(student_id=student.id)
 
-        if start_date:
-            start = datetime.fromisoformat(start_date)
-            query = query.filter(AttendanceRecord.timestamp >= start)
-
-        if end_date:
-            end = datetime.fromisoformat(end_date)
-            query = query.filter(AttendanceRecord.timestamp <= end)
-
-        query = query.order_by(AttendanceRecord.timestamp.desc())
-
-        if limit:
-            query = query.limit(limit)
+@api_bp.route('/sessions/<int:session_id>/end', methods=['POST'])
+def end_session(session_id):
+    """End an attendance session"""
+    session = DatabaseManager.end_session(session_id)
+    if not session:
+        abort(404, 'Session not found')
+    invalidate_status_cache()
+
+    # Prepare response data
+    response_data = {
+        'success': True,
+        'message': 'Session ended successfully',
+        'session': session.to_dict()
+    }
+
+    if not session.instructor_email:
+        print(f"[INFO] No instructor email provided for session {session_id}")
+        response_data['report_sent'] = False
+        response_data['report_info'] = 'No instructor email provided'
+        return jsonify(response_data), 200
 
-        records = query.all()
+    # Sheets export and SMTP take seconds; send the report in the background
+    # and let the client poll report-status for the outcome
+    job_id = uuid.uuid4().hex
+    future = _report_pool.submit(run_report_job, current_app._get_current_object(), session_id)
+    with _report_jobs_lock:
+        jobs = report_jobs()
+        jobs[job_id] = (session_id, future)
+        if len(jobs) > REPORT_JOBS_KEPT:
+            jobs.pop(next(iter(jobs)))
+    print(f"[INFO] Queued attendance report for session {session_id} (job {job_id})")
+
+    response_data['report_job_id'] = job_id
+    return jsonify(response_data), 202
+
+@api_bp.route('/sessions/<int:session_id>/report-status/<job_id>', methods=['GET'])
+def report_status(session_id, job_id):
+    """Get the outcome of a report job queued by end_session"""
+    session_and_future = report_jobs().get(job_id)
+    if session_and_future is None or session_and_future[0] != session_id:
+        abort(404, 'Report job not found')
+
+    future = session_and_future[1]
+    if not future.done():
+        return jsonify({'success': True, 'status': 'running'}), 200
+
+    return jsonify({'success': True, 'status': 'finished', **future.result()}), 200
 
+@api_bp.route('/sessions/<int:session_id>/resend-report', methods=['POST'])
+def resend_report(session_id):
+    """Manually resend attendance report for a completed session"""
+    # Get the session
+    session = DatabaseManager.get_session_by_id(session_id)
+    if not session:
+        abort(404, 'Session not found')
+
+    # Check if instructor email is provided
+    if not session.instructor_email:
+        abort(400, 'No instructor email configured for this session')
+
+    # Attendance records with student details
+    records_data = DatabaseManager.get_session_report_records(session_id)
+
+    if not records_data:
+        abort(400, 'No attendance records found for this session')
+
+    # Prepare session data
+    session_dict = session.to_dict()
+
+    # Create attendance report (Google Sheets, or Excel-only if that fails or is slow)
+    print(f"[INFO] Creating attendance report for session {session_id} (manual resend)")
+    report_result = create_attendance_report(
+        session_data=session_dict,
+        attendance_records=records_data
+    )
+
+    # Send email with attachment
+    print(f"[INFO] Sending email to {session.instructor_email} (manual resend)")
+    email_sent = send_attendance_report_email(
+        recipient_email=session.instructor_email,
+        session_data=session_dict,
+        excel_bytes=report_result['excel_bytes'],
+        excel_filename=report_result['excel_filename'],
+        spreadsheet_url=report_result.get('spreadsheet_url')
+    )
+
+    if email_sent:
         return jsonify({
             'success': True,
-            'count': len(records),
-            'records': [record.to_dict() for record in records]
+            'message': 'Report sent successfully',
+            'report_info': {
+                'spreadsheet_url': report_result.get('spreadsheet_url'),
+                'recipient': session.instructor_email,
+                'attendance_count': len(records_data)
+            }
         }), 200
-    except Exception as e:
-        return jsonify({
-            'success': False,
-            'error': str(e)
-        }), 500
+    else:
+        abort(500, 'Failed to send email. Check server logs for details.')
 
-@api_bp.route('/attendance', methods=['POST'])
-def mark_attendance():
-    """Mark attendance for a student"""
-    try:
-        data = request.get_json()
 
-        # Validate required fields
-        if not data.get('session_id') or not data.get('student_id'):
-            return jsonify({
-                'success': False,
-                'error': 'session_id and student_id are required'
-            }), 400
+# Attendance Record Endpoints
 
-        # Get student
-        student = DatabaseManager.get_student_by_id(data['student_id'])
-        if not student:
-            return jsonify({
-                'success': False,
-                'error': 'Student not found'
-            }), 404
-
-        # Mark attendance
-        record = DatabaseManager.mark_attendance(
-            session_id=data['session_id'],
-            student_db_id=student.id,
-            confidence_score=data.get('confidence_score', 0.0),
-            status=data.get('status', 'present'),
-            image_path=data.get('image_path'),
-            cooldown_minutes=current_app.config.get('ATTENDANCE_COOLDOWN_MINUTES', 5)
-        )
 
-        if not record:
-            return jsonify({
-                'success': False,
-                'error': 'Attendance already marked recently (within cooldown period)'
-            }), 400
+@api_bp.route('/attendance', methods=['GET'])
+def get_attendance():
+    """Get attendance records with optional filters"""
+    session_id = request.args.get('session_id', type=int)
+    student_id = request.args.get('student_id')
+    start = get_datetime_arg('start_date')
+    end = get_datetime_arg('end_date')
+    before = get_datetime_arg('before')  # Keyset cursor: timestamp of the last row seen
+    page, page_size, offset, include_total = get_pagination_args()
+    fields, unknown = get_fields_arg(AttendanceRecord)
+    if unknown:
+        abort(400, f'Unknown fields: {", ".join(unknown)}')
+
+    stmt = select(AttendanceRecord)
+
+    if session_id:
+        stmt = stmt.filter_by(session_id=session_id)
+
+    if student_id:
+        # Resolve the public student ID in the same query
+        stmt = stmt.filter(AttendanceRecord.student_id == select(Student.id).where(
+            Student.student_id == student_id
+        ).scalar_subquery())
+
+    if start and end:
+        stmt = stmt.filter(AttendanceRecord.timestamp.between(start, end))
+    elif start:
+        stmt = stmt.filter(AttendanceRecord.timestamp >= start)
+    elif end:
+        stmt = stmt.filter(AttendanceRecord.timestamp <= end)
+
+    total = count_rows(stmt, AttendanceRecord.id) if include_total else None
+
+    stmt = stmt.order_by(AttendanceRecord.timestamp.desc())
+
+    if before:
+        stmt = stmt.filter(AttendanceRecord.timestamp < before)
+    else:
+        stmt = stmt.offset(offset)
+
+    if fields:
+        stmt = stmt.options(load_fields(AttendanceRecord, fields), raiseload('*'))
+        serialize = lambda record: project(record, fields)
+    else:
+        # to_dict() reads the student's name and ID; join it instead of lazy-loading per row
+        stmt = stmt.options(joinedload(AttendanceRecord.student), raiseload('*'))
+        serialize = AttendanceRecord.to_dict
+
+    meta = {
+        'success': True,
+        'page': page,
+        'page_size': page_size
+    }
+    if total is not None:
+        meta['total'] = total
+
+    return stream_json_list('records', stmt.limit(page_size), serialize, meta)
 
-        return jsonify({
-            'success': True,
-            'message': 'Attendance marked successfully',
-            'record': record.to_dict()
-        }), 201
-    except Exception as e:
-        return jsonify({
-            'success': False,
-            'error': str(e)
-        }), 500
+@api_bp.route('/attendance', methods=['POST'])
+def mark_attendance():
+    """Mark attendance for a student"""
+    data = get_json_body(schemas.validate_mark_attendance)
+
+    # Mark attendance (student lookup and cooldown check happen in the same INSERT)
+    record = DatabaseManager.mark_attendance_by_student_id(
+        session_id=data['session_id'],
+        student_id=data['student_id'],
+        confidence_score=data.get('confidence_score', 0.0),
+        status=data.get('status', 'present'),
+        image_path=data.get('image_path'),
+        cooldown_minutes=current_app.config.get('ATTENDANCE_COOLDOWN_MINUTES', 5)
+    )
+
+    if not record:
+        # Only the rejection path pays for telling the two causes apart
+        if not DatabaseManager.get_student_ref(data['student_id']):
+            abort(404, 'Student not found')
+        abort(400, 'Attendance already marked recently (within cooldown period)')
+    invalidate_status_cache()
+
+    return jsonify({
+        'success': True,
+        'message': 'Attendance marked successfully',
+        'record': record.to_dict()
+    }), 201
 
 @api_bp.route('/attendance/stats', methods=['GET'])
 def get_attendance_stats():
     """Get attendance statistics"""
-    try:
-        session_id = request.args.get('session_id', type=int)
-        stats = DatabaseManager.get_attendance_stats(session_id)
+    session_id = request.args.get('session_id', type=int)
+    stats = DatabaseManager.get_attendance_stats(session_id)
 
-        return jsonify({
-            'success': True,
-            'stats': stats
-        }), 200
-    except Exception as e:
-        return jsonify({
-            'success': False,
-            'error': str(e)
-        }), 500
+    # A state fingerprint would cost as many aggregates as the stats query
+    # itself, so the ETag hashes the (small) body instead
+    return conditional_json({
+        'success': True,
+        'stats': stats
+    })
 
 
 # System Status Endpoints
@@ -604,39 +893,55 @@ def get_attendance_stats():
 @api_bp.route('/status', methods=['GET'])
 def system_status():
     """Get system status"""
-    try:
-        total_students = Student.query.filter_by(status='active').count()
-        total_sessions = AttendanceSession.query.count()
-        total_records = AttendanceRecord.query.count()
-        active_session = DatabaseManager.get_active_session()
+    # The ETag covers the cached aggregates only, so a 304 skips serialization
+    # entirely; the timestamp is refreshed whenever the body is resent
+    status = dict(get_cached_status())
+    status['timestamp'] = datetime.utcnow().isoformat()
+
+    return conditional_json({
+        'success': True,
+        'status': status
+    }, etag=get_cached_status_etag(), max_age=STATUS_CACHE_TTL)
+
+# (unix second, serialized body) of the last /health response
+_health_cache = (0, b'')
 
-        return jsonify({
-            'success': True,
-            'status': {
-                'total_students': total_students,
-                'total_sessions': total_sessions,
-                'total_attendance_records': total_records,
-                'active_session': active_session.to_dict() if active_session else None,
-                'timestamp': datetime.utcnow().isoformat()
-            }
-        }), 200
-    except Exception as e:
-        return jsonify({
-            'success': False,
-            'error': str(e)
-        }), 500
 
 @api_bp.route('/health', methods=['GET'])
 def health_check():
-    """Health check endpoint"""
-    return jsonify({
-        'status': 'healthy',
-        'timestamp': datetime.utcnow().isoformat()
-    }), 200
+    """Health check endpoint (body re-serialized at most once per second)"""
+    global _health_cache
+
+    now = int(time.time())
+    if _health_cache[0] != now:
+        _health_cache = (now, json_bytes({
+            'status': 'healthy',
+            'timestamp': datetime.utcnow().isoformat()
+        }))
+    return Response(_health_cache[1], mimetype='application/json')
 
 
 # Live Recognition & Video Streaming Endpoints
 
+def get_recognition_service(create=True):
+    """
+    Return the app's FaceRecognitionService from app.extensions
+
+    The service owns the camera, so it is created at most once per app,
+    on first use and under a lock; with create=False returns None if it
+    has not been started yet.
+    """
+    app = current_app._get_current_object()
+    service = app.extensions.get('recognition')
+    if service is None and create:
+        with _recognition_lock:
+            service = app.extensions.get('recognition')
+            if service is None:
+                if FaceRecognitionService is None:
+                    abort(503, 'Recognition is unavailable: camera/model libraries are not installed')
+                service = FaceRecognitionService(flask_app=app)
+                app.extensions['recognition'] = service
+    return service
 
 @api_bp.route('/recognition/stream', methods=['GET'])
 def video_stream():
@@ -644,317 +949,333 @@ def video_stream():
     Video streaming endpoint - returns MJPEG stream
     Usage: <img src="/api/recognition/stream">
     """
-    global recognition_service
-
-    try:
-        # Get active session for auto-attendance marking
-        active_session = DatabaseManager.get_active_session()
-        session_id = active_session.id if active_session else None
-
-        # Initialize recognition service if not already done
-        if recognition_service is None:
-            from recognition_service import FaceRecognitionService
-            from flask import current_app
-            recognition_service = FaceRecognitionService(flask_app=current_app._get_current_object())
-
-        # Create a wrapper generator that maintains Flask app context
-        from flask import current_app
-        app = current_app._get_current_object()
-
-        def generate_with_context():
-            with app.app_context():
-                yield from recognition_service.generate_frames(
-                    session_id=session_id,
-                    auto_mark_attendance=True
-                )
-
-        # Return streaming response
-        return Response(
-            generate_with_context(),
-            mimetype='multipart/x-mixed-replace; boundary=frame'
-        )
-    except Exception as e:
-        return jsonify({
-            'success': False,
-            'error': f'Failed to start video stream: {str(e)}'
-        }), 500
+    # Initialize recognition service if needed
+    recognition_service = get_recognition_service()
+
+    # Frames come from the service's shared producer thread; this response
+    # only relays them, so concurrent viewers do not each run recognition.
+    # The producer marks attendance in whichever session is active at the time.
+    return Response(
+        recognition_service.recognition_frames(
+            current_app._get_current_object(),
+            auto_mark_attendance=True
+        ),
+        mimetype='multipart/x-mixed-replace; boundary=frame',
+        direct_passthrough=True  # Parts are ready-made bytes; skip per-item encoding
+    )
 
 @api_bp.route('/recognition/status', methods=['GET'])
 def recognition_status():
     """Get recognition service status"""
-    global recognition_service
+    recognition_service = get_recognition_service(create=False)
 
-    try:
-        active_session = DatabaseManager.get_active_session()
+    active_session = get_cached_status()['active_session']
 
-        return jsonify({
-            'success': True,
-            'status': {
-                'service_initialized': recognition_service is not None,
-                'camera_active': recognition_service.camera_started if recognition_service else False,
-                'active_session': active_session.to_dict() if active_session else None,
-                'known_faces': len(recognition_service.known_names) if recognition_service else 0
-            }
-        }), 200
-    except Exception as e:
-        return jsonify({
-            'success': False,
-            'error': str(e)
-        }), 500
+    return conditional_json({
+        'success': True,
+        'status': {
+            'service_initialized': recognition_service is not None,
+            'camera_active': recognition_service.camera_started if recognition_service else False,
+            'active_session': active_session,
+            'known_faces': len(recognition_service.known_names) if recognition_service else 0
+        }
+    }, max_age=STATUS_CACHE_TTL)
 
 @api_bp.route('/recognition/reload', methods=['POST'])
 def reload_encodings():
     """Reload face encodings from database"""
-    global recognition_service
+    recognition_service = get_recognition_service(create=False)
 
-    try:
-        if recognition_service is None:
-            return jsonify({
-                'success': False,
-                'error': 'Recognition service not initialized'
-            }), 400
+    if recognition_service is None:
+        abort(400, 'Recognition service not initialized')
 
-        recognition_service.load_encodings_from_db()
+    recognition_service.load_encodings_from_db()
 
-        return jsonify({
-            'success': True,
-            'message': 'Face encodings reloaded',
-            'count': len(recognition_service.known_names)
-        }), 200
-    except Exception as e:
-        return jsonify({
-            'success': False,
-            'error': str(e)
-        }), 500
+    return jsonify({
+        'success': True,
+        'message': 'Face encodings reloaded',
+        'count': len(recognition_service.known_names)
+    }), 200
 
 @api_bp.route('/recognition/stop', methods=['POST'])
 def stop_recognition_stream():
     """Stop the recognition video stream"""
-    global recognition_service
+    recognition_service = get_recognition_service(create=False)
 
-    try:
-        print("[API] /recognition/stop endpoint called")
+    logger.debug("/recognition/stop endpoint called")
 
-        if recognition_service is None:
-            print("[API] Recognition service not initialized")
-            return jsonify({
-                'success': False,
-                'error': 'Recognition service not initialized'
-            }), 400
+    if recognition_service is None:
+        abort(400, 'Recognition service not initialized')
 
-        print("[API] Calling recognition_service.stop_recognition_stream()")
-        recognition_service.stop_recognition_stream()
-        print("[API] Stream stop signal sent successfully")
+    recognition_service.stop_recognition_stream()
+    logger.debug("Stream stop signal sent")
 
-        return jsonify({
-            'success': True,
-            'message': 'Recognition stream stopped'
-        }), 200
-    except Exception as e:
-        print(f"[API] Error in stop endpoint: {e}")
-        return jsonify({
-            'success': False,
-            'error': str(e)
-        }), 500
+    return jsonify({
+        'success': True,
+        'message': 'Recognition stream stopped'
+    }), 200
 
 
 # Enrollment Endpoints
 
+def pending_encodings():
+    """Enrollment encodings captured but not yet saved, keyed by student database ID"""
+    return current_app.extensions.setdefault('pending_encodings', defaultdict(list))
+
+
+# Seconds an enrollment stays cached after its last photo capture
+ENROLLMENT_TTL = 600
+
+# Buffered encodings are saved once this many are pending (and the first one
+# right away), so a crash or restart loses at most a few photos
+ENROLLMENT_FLUSH_BATCH = 3
+
+
+def enrollments():
+    """In-progress enrollments, keyed by student ID (see capture_enrollment_photo)"""
+    return current_app.extensions.setdefault('enrollments', {})
+
+
+def end_enrollment(student_id):
+    """Forget a student's in-progress enrollment and any encodings it still buffers"""
+    with _enrollment_lock:
+        enrollment = enrollments().pop(student_id, None)
+        if enrollment is not None:
+            pending_encodings().pop(enrollment['student_db_id'], None)
+
+
+def expire_enrollments():
+    """Save the buffered encodings of enrollments abandoned past ENROLLMENT_TTL, then forget them"""
+    now = time.monotonic()
+    with _enrollment_lock:
+        active = enrollments()
+        stale_ids = [key for key, value in active.items() if value['expires'] < now]
+        stale_db_ids = [active.pop(key)['student_db_id'] for key in stale_ids]
+    for student_db_id in stale_db_ids:
+        try:
+            flush_pending_encodings(student_db_id)
+        except Exception as error:
+            # Kept buffered; the student's next flush retries (see flush_pending_encodings)
+            logger.error("Saving expired enrollment encodings for student %s failed: %s",
+                         student_db_id, error, exc_info=error)
+
+
+def flush_pending_encodings(student_db_id=None):
+    """
+    Save buffered enrollment encodings with one INSERT and commit per student
+
+    Flushes every student's buffer when student_db_id is None.
+    Returns the number of encodings saved. A batch whose INSERT fails is
+    returned to its buffer and the error re-raised once the rest are saved.
+    """
+    with _enrollment_lock:
+        buffers = pending_encodings()
+        if student_db_id is None:
+            batches = list(buffers.items())
+            buffers.clear()
+        else:
+            batches = [(student_db_id, buffers.pop(student_db_id, []))]
+
+    # Keep an image path only once its background write is confirmed
+    recognition_service = get_recognition_service(create=False)
+    if recognition_service is not None:
+        batches = [(db_id, [
+            (encoding, quality_score, image_path if image_path and recognition_service.photo_saved(image_path) else None, created_at)
+            for encoding, quality_score, image_path, created_at in encodings
+        ]) for db_id, encodings in batches]
+
+    saved = 0
+    failed = None
+    for db_id, encodings in batches:
+        try:
+            saved += DatabaseManager.add_face_encodings(db_id, encodings)
+        except Exception as error:
+            # Put the batch back ahead of anything captured since, so the
+            # photos are saved by a later flush instead of being lost
+            db.session.rollback()
+            with _enrollment_lock:
+                buffers = pending_encodings()
+                buffers[db_id] = encodings + buffers[db_id]
+            failed = failed or error
+    if failed is not None:
+        raise failed
+    return saved
+
+
 @api_bp.route('/enrollment/start', methods=['POST'])
 def start_enrollment():
     """
     Start enrollment session for a student
     Validates student info but doesn't create record yet (waits for photos)
     """
-    global recognition_service
+    data = get_json_body(schemas.validate_create_student)
 
-    try:
-        data = request.get_json()
-
-        # Validate required fields
-        if not data.get('student_id') or not data.get('name'):
-            return jsonify({
-                'success': False,
-                'error': 'student_id and name are required'
-            }), 400
-
-        # Check if student already exists
-        existing = DatabaseManager.get_student_by_id(data['student_id'])
-        if existing:
-            return jsonify({
-                'success': False,
-                'error': 'Student with this ID already exists'
-            }), 400
-
-        # Initialize recognition service if needed
-        if recognition_service is None:
-            from recognition_service import FaceRecognitionService
-            recognition_service = FaceRecognitionService(flask_app=current_app._get_current_object())
-
-        # Return success without creating student yet
-        # Student will be created when first photo is captured
-        return jsonify({
-            'success': True,
-            'message': 'Validation passed, ready for photo capture',
-            'student_data': data  # Return the data for frontend to store temporarily
-        }), 200
-    except Exception as e:
-        return jsonify({
-            'success': False,
-            'error': str(e)
-        }), 500
+    # Nothing is inserted until the first photo, so no constraint can catch a
+    # duplicate here; without this check its photos would join the existing student
+    if DatabaseManager.student_exists(data['student_id']):
+        abort(400, INTEGRITY_ERROR_MESSAGES['student_id'])
 
-@api_bp.route('/enrollment/capture', methods=['POST'])
-def capture_enrollment_photo():
+    # Initialize recognition service if needed
+    get_recognition_service()
+
+    # Return success without creating student yet
+    # Student will be created when first photo is captured
+    return jsonify({
+        'success': True,
+        'message': 'Validation passed, ready for photo capture',
+        'student_data': data  # Return the data for frontend to store temporarily
+    }), 200
+
+def begin_enrollment(student_id, data):
     """
-    Capture a single photo for enrollment
-    Creates student record on first photo capture
+    Resolve (or create) the student for an enrollment and prepare its photo directory
+
+    Creates the student record on the first photo capture.
+    Returns the enrollment: database ID, name, directory and the number of
+    encodings already saved.
     """
-    global recognition_service
+    # Saves a previous, expired enrollment's photos before they are counted
+    expire_enrollments()
 
-    try:
-        data = request.get_json()
+    student_ref = DatabaseManager.get_student_ref(student_id)
 
-        if not data.get('student_id'):
-            return jsonify({
-                'success': False,
-                'error': 'student_id is required'
-            }), 400
+    # If student doesn't exist, create them now (first photo capture)
+    if not student_ref:
+        # Student data should be passed from frontend
+        if not data.get('name'):
+            abort(400, 'Student data required for first photo capture')
 
-        # Check if student exists
-        student = DatabaseManager.get_student_by_id(data['student_id'])
+        print(f"[INFO] Creating student record on first photo: {student_id}")
+        student = DatabaseManager.create_student(
+            student_id=student_id,
+            name=data['name'],
+            email=data.get('email'),
+            phone=data.get('phone'),
+            program=data.get('program'),
+            year_of_study=data.get('year_of_study')
+        )
 
-        # If student doesn't exist, create them now (first photo capture)
         if not student:
-            # Student data should be passed from frontend
-            if not data.get('name'):
-                return jsonify({
-                    'success': False,
-                    'error': 'Student data required for first photo capture'
-                }), 400
-
-            print(f"[INFO] Creating student record on first photo: {data['student_id']}")
-            student = DatabaseManager.create_student(
-                student_id=data['student_id'],
-                name=data['name'],
-                email=data.get('email'),
-                phone=data.get('phone'),
-                program=data.get('program'),
-                year_of_study=data.get('year_of_study')
-            )
+            abort(500, 'Failed to create student record')
+        invalidate_status_cache()
+        student_ref = (student.id, student.name)
 
-            if not student:
-                return jsonify({
-                    'success': False,
-                    'error': 'Failed to create student record'
-                }), 500
-
-        # Initialize recognition service if needed
-        if recognition_service is None:
-            from recognition_service import FaceRecognitionService
-            recognition_service = FaceRecognitionService(flask_app=current_app._get_current_object())
-
-        # Create enrollment directory if needed
-        enrollment_dir = os.path.join(current_app.config['UPLOAD_FOLDER'], 'enrollments', student.student_id)
-        os.makedirs(enrollment_dir, exist_ok=True)
-
-        # Generate filename
-        from datetime import datetime
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
-        filename = f"{student.student_id}_{timestamp}.jpg"
-        filepath = os.path.join(enrollment_dir, filename)
-
-        # Capture photo and get embedding
-        success, embedding, quality_score = recognition_service.capture_enrollment_photo_with_quality(
-            person_name=student.name,
-            save_path=filepath
-        )
+    student_db_id, student_name = student_ref
 
-        if not success:
-            return jsonify({
-                'success': False,
-                'error': 'Failed to capture photo or detect face'
-            }), 400
-
-        # Save embedding to database
-        # Pass student.student_id (the string ID like "STU001")
-        face_encoding = DatabaseManager.add_face_encoding(
-            student_id=student.student_id,  # Pass string student ID
-            encoding=embedding,
-            quality_score=quality_score,
-            image_path=filepath
-        )
+    enrollment_dir = os.path.join(current_app.config['UPLOAD_FOLDER'], 'enrollments', student_id)
+    os.makedirs(enrollment_dir, exist_ok=True)
 
-        if not face_encoding:
-            return jsonify({
-                'success': False,
-                'error': 'Failed to save face encoding to database'
-            }), 500
+    enrollment = {
+        'student_db_id': student_db_id,
+        'name': student_name,
+        'dir': enrollment_dir,
+        'saved_encodings': DatabaseManager.count_face_encodings(student_db_id),
+        'expires': time.monotonic() + ENROLLMENT_TTL
+    }
+    with _enrollment_lock:
+        enrollments()[student_id] = enrollment
+    return enrollment
 
-        return jsonify({
-            'success': True,
-            'message': 'Photo captured successfully',
-            'encoding_id': face_encoding.id,
-            'quality_score': quality_score,
-            'image_path': filepath,
-            'total_encodings': len(student.face_encodings)
-        }), 201
-    except Exception as e:
-        import traceback
-        traceback.print_exc()
-        return jsonify({
-            'success': False,
-            'error': str(e)
-        }), 500
+
+@api_bp.route('/enrollment/capture', methods=['POST'])
+def capture_enrollment_photo():
+    """
+    Capture a single photo for enrollment
+    Creates student record on first photo capture
+    """
+    data = get_json_body(schemas.validate_capture_photo)
+    student_id = data['student_id']
+    now = time.monotonic()
+
+    # The student and directory are resolved on the first capture and reused
+    # for the rest of the enrollment
+    with _enrollment_lock:
+        enrollment = enrollments().get(student_id)
+        if enrollment is not None and enrollment['expires'] >= now:
+            enrollment['expires'] = now + ENROLLMENT_TTL
+        else:
+            enrollment = None
+    if enrollment is None:
+        enrollment = begin_enrollment(student_id, data)
+
+    # Initialize recognition service if needed
+    recognition_service = get_recognition_service()
+
+    # Generate filename
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+    filename = f"{student_id}_{timestamp}.jpg"
+    filepath = os.path.join(enrollment['dir'], filename)
+
+    # Capture photo and get embedding
+    success, embedding, quality_score = recognition_service.capture_enrollment_photo_with_quality(
+        person_name=enrollment['name'],
+        save_path=filepath
+    )
+
+    if not success:
+        abort(400, 'Failed to capture photo or detect face')
+
+    # Buffer the embedding and save the buffer in batches (the first photo at
+    # once, so a created student is never left without encodings)
+    student_db_id = enrollment['student_db_id']
+    with _enrollment_lock:
+        pending = pending_encodings()[student_db_id]
+        pending.append((embedding, quality_score, filepath, datetime.utcnow()))
+        flush = enrollment['saved_encodings'] == 0 or len(pending) >= ENROLLMENT_FLUSH_BATCH
+    if flush:
+        saved = flush_pending_encodings(student_db_id)
+        with _enrollment_lock:
+            enrollment['saved_encodings'] += saved
+    with _enrollment_lock:
+        total_encodings = enrollment['saved_encodings'] + len(pending_encodings().get(student_db_id, ()))
+
+    return jsonify({
+        'success': True,
+        'message': 'Photo captured successfully',
+        'quality_score': quality_score,
+        'image_path': filepath,
+        'total_encodings': total_encodings
+    }), 201
 
 @api_bp.route('/enrollment/complete', methods=['POST'])
 def complete_enrollment():
     """
     Complete enrollment process
-    Validates that sufficient photos have been captured and reloads encodings
+    Saves the buffered encodings in one batch, validates that sufficient
+    photos have been captured and reloads encodings
     """
-    global recognition_service
+    recognition_service = get_recognition_service(create=False)
 
-    try:
-        data = request.get_json()
+    data = get_json_body(schemas.validate_student_ref)
 
-        if not data.get('student_id'):
-            return jsonify({
-                'success': False,
-                'error': 'student_id is required'
-            }), 400
+    # Get student
+    student = DatabaseManager.get_student_by_id(data['student_id'])
+    if not student:
+        abort(404, 'Student not found')
 
-        # Get student
-        student = DatabaseManager.get_student_by_id(data['student_id'])
-        if not student:
-            return jsonify({
-                'success': False,
-                'error': 'Student not found'
-            }), 404
-
-        # Check if sufficient encodings
-        encoding_count = len(student.face_encodings)
-        if encoding_count < 3:
-            return jsonify({
-                'success': False,
-                'error': f'Insufficient photos. Please capture at least 3 photos (current: {encoding_count})'
-            }), 400
-
-        # Reload encodings into recognition service
-        if recognition_service:
-            recognition_service.load_encodings_from_db()
+    # Save the photos buffered during capture
+    flush_pending_encodings(student.id)
+    end_enrollment(student.student_id)
 
-        return jsonify({
-            'success': True,
-            'message': f'Enrollment complete! {encoding_count} photos captured.',
-            'student': student.to_dict(),
-            'encoding_count': encoding_count
-        }), 200
-    except Exception as e:
-        return jsonify({
-            'success': False,
-            'error': str(e)
-        }), 500
+    # Check if sufficient encodings
+    encoding_count, mean_quality, min_quality = DatabaseManager.get_face_encoding_quality(student.id)
+    if encoding_count < 3:
+        abort(400, f'Insufficient photos. Please capture at least 3 photos (current: {encoding_count})')
+
+    # Refresh this student's encodings in the recognition service
+    if recognition_service:
+        recognition_service.load_student_encodings_from_db(student.id)
+
+    return jsonify({
+        'success': True,
+        'message': f'Enrollment complete! {encoding_count} photos captured.',
+        'student': student.to_summary_dict(),
+        'encoding_count': encoding_count,
+        'quality': {
+            'mean': mean_quality,
+            'min': min_quality
+        }
+    }), 200
 
 @api_bp.route('/enrollment/preview', methods=['GET'])
 def enrollment_preview_stream():
@@ -962,54 +1283,44 @@ def enrollment_preview_stream():
     Video preview stream for enrollment
     Shows live camera feed with face detection overlay
     """
-    global recognition_service
-
-    try:
-        # Initialize recognition service if needed
-        if recognition_service is None:
-            from recognition_service import FaceRecognitionService
-            recognition_service = FaceRecognitionService(flask_app=current_app._get_current_object())
+    # Initialize recognition service if needed
+    recognition_service = get_recognition_service()
 
-        # Get Flask app for context
-        app = current_app._get_current_object()
-
-        def generate_preview():
-            with app.app_context():
-                yield from recognition_service.generate_enrollment_preview()
-
-        return Response(
-            generate_preview(),
-            mimetype='multipart/x-mixed-replace; boundary=frame'
-        )
-    except Exception as e:
-        return jsonify({
-            'success': False,
-            'error': f'Failed to start preview stream: {str(e)}'
-        }), 500
+    return Response(
+        recognition_service.enrollment_preview_frames(current_app._get_current_object()),
+        mimetype='multipart/x-mixed-replace; boundary=frame',
+        direct_passthrough=True
+    )
 
 @api_bp.route('/enrollment/stop', methods=['POST'])
 def stop_enrollment_stream():
-    """Stop the enrollment preview stream"""
-    global recognition_service
+    """
+    Stop the enrollment preview stream
 
-    try:
-        if recognition_service is None:
-            return jsonify({
-                'success': False,
-                'error': 'Recognition service not initialized'
-            }), 400
+    Ends the caller's enrollment (student_id in the body), keeping the photos
+    captured so far; other students' enrollments are left running.
+    """
+    recognition_service = get_recognition_service(create=False)
 
-        recognition_service.stop_enrollment_stream()
+    # sendBeacon on page unload posts the body as text/plain
+    data = request.get_json(silent=True, force=True) or {}
+    student_id = data.get('student_id') if isinstance(data, dict) else None
+    if student_id:
+        student_ref = DatabaseManager.get_student_ref(student_id)
+        if student_ref:
+            flush_pending_encodings(student_ref[0])
+        end_enrollment(student_id)
+    expire_enrollments()
 
-        return jsonify({
-            'success': True,
-            'message': 'Enrollment preview stream stopped'
-        }), 200
-    except Exception as e:
-        return jsonify({
-            'success': False,
-            'error': str(e)
-        }), 500
+    if recognition_service is None:
+        abort(400, 'Recognition service not initialized')
+
+    recognition_service.stop_enrollment_stream()
+
+    return jsonify({
+        'success': True,
+        'message': 'Enrollment preview stream stopped'
+    }), 200
 
 
 # Settings/Configuration Endpoints
@@ -1017,68 +1328,49 @@ def stop_enrollment_stream():
 @api_bp.route('/settings', methods=['GET'])
 def get_settings():
     """Get all system settings"""
-    try:
-        configs = DatabaseManager.get_all_configs()
-        settings = {config.key: config.value for config in configs}
+    settings = DatabaseManager.get_settings()
 
-        # Provide defaults if not set
-        if 'late_threshold_minutes' not in settings:
-            settings['late_threshold_minutes'] = '30'
+    # Provide defaults if not set
+    if 'late_threshold_minutes' not in settings:
+        settings['late_threshold_minutes'] = '30'
 
-        return jsonify({
-            'success': True,
-            'settings': settings
-        }), 200
-    except Exception as e:
-        return jsonify({
-            'success': False,
-            'error': str(e)
-        }), 500
+    # Settings come from the in-process cache, so hashing the (small) body
+    # is the whole cost of a revalidation
+    return conditional_json({
+        'success': True,
+        'settings': settings
+    })
 
 @api_bp.route('/settings', methods=['POST'])
 def update_settings():
     """Update system settings"""
-    try:
-        data = request.get_json()
-
-        if not data:
-            return jsonify({
-                'success': False,
-                'error': 'No settings provided'
-            }), 400
-
-        # Update each setting
-        for key, value in data.items():
-            # Validate late_threshold_minutes
-            if key == 'late_threshold_minutes':
-                try:
-                    threshold = int(value)
-                    if threshold < 0:
-                        return jsonify({
-                            'success': False,
-                            'error': 'Late threshold must be a positive number'
-                        }), 400
-                except ValueError:
-                    return jsonify({
-                        'success': False,
-                        'error': 'Late threshold must be a valid number'
-                    }), 400
-
-                DatabaseManager.set_config(
-                    'late_threshold_minutes',
-                    str(threshold),
-                    'Minutes after session start to mark attendance as late'
-                )
-            else:
-                # Store other settings as-is
-                DatabaseManager.set_config(key, str(value))
+    data = request.get_json()
 
-        return jsonify({
-            'success': True,
-            'message': 'Settings updated successfully'
-        }), 200
-    except Exception as e:
-        return jsonify({
-            'success': False,
-            'error': str(e)
-        }), 500
\ No newline at end of file
+    if not data:
+        abort(400, 'No settings provided')
+
+    # Validate everything first, then write all settings in one upsert
+    values = {}
+    descriptions = {}
+    for key, value in data.items():
+        # Validate late_threshold_minutes
+        if key == 'late_threshold_minutes':
+            try:
+                threshold = int(value)
+                if threshold < 0:
+                    abort(400, 'Late threshold must be a positive number')
+            except ValueError:
+                abort(400, 'Late threshold must be a valid number')
+
+            values[key] = str(threshold)
+            descriptions[key] = 'Minutes after session start to mark attendance as late'
+        else:
+            # Store other settings as-is
+            values[key] = str(value)
+
+    DatabaseManager.set_configs(values, descriptions)
+
+    return jsonify({
+        'success': True,
+        'message': 'Settings updated successfully'
+    }), 200
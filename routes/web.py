@@ -2,50 +2,97 @@
 Web Routes for Face Attendance System
 HTML page routes for the dashboard
 """
-from flask import Blueprint, render_template, redirect, url_for, request
-from models import db, Student, AttendanceSession, AttendanceRecord
+from flask import Blueprint, render_template, redirect, url_for, request, make_response
+from functools import lru_cache
+from models import db, Student, FaceEncoding, AttendanceSession, AttendanceRecord
 from database import DatabaseManager
+from sqlalchemy import func, select
+from sqlalchemy.orm import joinedload
 from datetime import datetime, timedelta
+from utils import cache_headers, content_etag, convert_many_utc_to_local, not_modified
+import time
 
 web_bp = Blueprint('web', __name__)
 
+# Templates only change with a restart; salting page ETags with the start
+# time keeps browsers from reusing a page rendered by an older version
+_PAGE_ETAG_SALT = repr(time.time()).encode()
+
+# Seconds the rendered dashboard may be served from cache. Writes made through
+# DatabaseManager in this process (including attendance marked by the
+# recognition thread) drop it at once; other workers' after the TTL.
+DASHBOARD_CACHE_TTL = 5
+
+
+@lru_cache(maxsize=1)
+def _render_dashboard(time_bucket, data_epoch):
+    """Render the dashboard, memoized per DASHBOARD_CACHE_TTL bucket and DatabaseManager.data_epoch()"""
+    # Get active session
+    active_session = DatabaseManager.get_active_session()
+
+    # Get recent sessions
+    recent_sessions = AttendanceSession.query.order_by(
+        AttendanceSession.start_time.desc()
+    ).limit(5).all()
+
+    # Get statistics, including today's attendance
+    today_start = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    total_students, total_sessions, today_attendance = \
+        DatabaseManager.get_dashboard_counts(today_start)
+
+    return render_template('index.html',
+                         active_session=active_session,
+                         recent_sessions=recent_sessions,
+                         total_students=total_students,
+                         total_sessions=total_sessions,
+                         today_attendance=today_attendance)
+
+
+def invalidate_dashboard_cache():
+    """Drop the cached dashboard after a write that changes it"""
+    _render_dashboard.cache_clear()
+
+
 @web_bp.route('/')
 def index():
     """Home page - Dashboard"""
     try:
-        # Get active session
-        active_session = DatabaseManager.get_active_session()
-
-        # Get recent sessions
-        recent_sessions = AttendanceSession.query.order_by(
-            AttendanceSession.start_time.desc()
-        ).limit(5).all()
-
-        # Get statistics
-        total_students = Student.query.filter_by(status='active').count()
-        total_sessions = AttendanceSession.query.count()
-
-        # Get today's attendance
-        today_start = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
-        today_attendance = AttendanceRecord.query.filter(
-            AttendanceRecord.timestamp >= today_start
-        ).count()
-
-        return render_template('index.html',
-                             active_session=active_session,
-                             recent_sessions=recent_sessions,
-                             total_students=total_students,
-                             total_sessions=total_sessions,
-                             today_attendance=today_attendance)
+        return _render_dashboard(int(time.monotonic() // DASHBOARD_CACHE_TTL),
+                                 DatabaseManager.data_epoch())
     except Exception as e:
         return render_template('error.html', error=str(e)), 500
 
+def page_etag(stmt):
+    """
+    ETag for a page from one SELECT of cheap aggregates over the data it shows
+
+    Checked before the page's rows are loaded, so an unchanged page costs
+    this query and an empty 304.
+    """
+    state = db.session.execute(stmt).one()
+    return content_etag(repr(tuple(state)).encode() + request.full_path.encode() + _PAGE_ETAG_SALT)
+
+
 @web_bp.route('/students')
 def students_page():
     """Students management page"""
     try:
+        # Any student insert, update or delete changes the count or latest
+        # updated_at; the encoding count/last ID cover the photo counts
+        etag = page_etag(
+            select(
+                func.count(Student.id),
+                func.max(Student.updated_at),
+                select(func.count(FaceEncoding.id)).scalar_subquery(),
+                select(func.max(FaceEncoding.id)).scalar_subquery()
+            ).filter(Student.status == 'active')
+        )
+        response = not_modified(etag)
+        if response is not None:
+            return response
+
         students = DatabaseManager.get_all_students('active')
-        return render_template('students.html', students=students)
+        return cache_headers(make_response(render_template('students.html', students=students)), etag)
     except Exception as e:
         return render_template('error.html', error=str(e)), 500
 
@@ -53,10 +100,25 @@ def students_page():
 def sessions_page():
     """Sessions management page"""
     try:
+        # Same state as GET /api/sessions: sessions are only created and
+        # ended, and their counts change only as records are added or removed
+        etag = page_etag(
+            select(
+                func.count(AttendanceSession.id),
+                func.max(AttendanceSession.id),
+                func.max(AttendanceSession.end_time),
+                select(func.count(AttendanceRecord.id)).scalar_subquery(),
+                select(func.max(AttendanceRecord.id)).scalar_subquery()
+            )
+        )
+        response = not_modified(etag)
+        if response is not None:
+            return response
+
         sessions = AttendanceSession.query.order_by(
             AttendanceSession.start_time.desc()
         ).all()
-        return render_template('sessions.html', sessions=sessions)
+        return cache_headers(make_response(render_template('sessions.html', sessions=sessions)), etag)
     except Exception as e:
         return render_template('error.html', error=str(e)), 500
 
@@ -71,12 +133,18 @@ def session_detail(session_id):
         # Get attendance records for this session
         records = DatabaseManager.get_session_attendance(session_id)
 
-        # Get statistics
-        stats = DatabaseManager.get_attendance_stats(session_id)
+        # Get statistics from the records already loaded
+        statuses = [record.status for record in records]
+        stats = {
+            'total': len(statuses),
+            'present': statuses.count('present'),
+            'late': statuses.count('late')
+        }
 
         return render_template('session_detail.html',
                              session=session,
                              records=records,
+                             local_times=convert_many_utc_to_local([record.timestamp for record in records]),
                              stats=stats)
     except Exception as e:
         return render_template('error.html', error=str(e)), 500
@@ -89,19 +157,22 @@ def attendance_page():
         session_id = request.args.get('session_id', type=int)
         student_id = request.args.get('student_id')
 
-        query = AttendanceRecord.query
+        # Load the student and session of each row in the same query
+        query = AttendanceRecord.query.options(
+            joinedload(AttendanceRecord.student),
+            joinedload(AttendanceRecord.session)
+        )
 
         if session_id:
             query = query.filter_by(session_id=session_id)
 
         if student_id:
-            student = DatabaseManager.get_student_by_id(student_id)
-            if student:
-                query = query.filter_by(student_id=student.id)
+            query = query.join(AttendanceRecord.student).filter(Student.student_id == student_id)
 
         records = query.order_by(AttendanceRecord.timestamp.desc()).limit(100).all()
+        local_times = convert_many_utc_to_local([record.timestamp for record in records])
 
-        return render_template('attendance.html', records=records)
+        return render_template('attendance.html', records=records, local_times=local_times)
     except Exception as e:
         return render_template('error.html', error=str(e)), 500
 
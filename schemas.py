@@ -0,0 +1,87 @@
+"""
+JSON request body schemas for the API, compiled once at import time
+"""
+import fastjsonschema
+from fastjsonschema import JsonSchemaException
+
+_REQUIRED_STRING = {'type': 'string', 'minLength': 1}
+_OPTIONAL_STRING = {'type': ['string', 'null']}
+
+_STUDENT_PROPERTIES = {
+    'student_id': _REQUIRED_STRING,
+    'name': _REQUIRED_STRING,
+    'email': _OPTIONAL_STRING,
+    'phone': _OPTIONAL_STRING,
+    'program': _OPTIONAL_STRING,
+    'year_of_study': {'type': ['integer', 'null']}
+}
+
+
+def compile_body_schema(schema):
+    """
+    Compile a request body schema into a validator
+
+    The validator returns the validated data, or raises ValueError with a
+    message fit for the client (missing required fields are reported
+    together, as "x and y are required").
+    """
+    validate = fastjsonschema.compile(schema)
+    required = schema.get('required', [])
+    missing_message = f"{' and '.join(required)} {'are' if len(required) > 1 else 'is'} required"
+
+    def validate_body(data):
+        try:
+            return validate(data)
+        except JsonSchemaException as e:
+            if e.rule in ('required', 'minLength'):
+                raise ValueError(missing_message) from None
+            if e.name == 'data':
+                raise ValueError('Request body must be a JSON object') from None
+            raise ValueError(e.message.replace('data.', '', 1)) from None
+
+    return validate_body
+
+
+validate_create_student = compile_body_schema({
+    'type': 'object',
+    'required': ['student_id', 'name'],
+    'properties': _STUDENT_PROPERTIES
+})
+
+validate_create_session = compile_body_schema({
+    'type': 'object',
+    'required': ['session_name'],
+    'properties': {
+        'session_name': _REQUIRED_STRING,
+        'course_code': _OPTIONAL_STRING,
+        'course_name': _OPTIONAL_STRING,
+        'instructor_name': _OPTIONAL_STRING,
+        'instructor_email': _OPTIONAL_STRING,
+        'location': _OPTIONAL_STRING
+    }
+})
+
+validate_mark_attendance = compile_body_schema({
+    'type': 'object',
+    'required': ['session_id', 'student_id'],
+    'properties': {
+        'session_id': {'type': 'integer', 'minimum': 1},
+        'student_id': _REQUIRED_STRING,
+        'confidence_score': {'type': 'number'},
+        'status': {'type': 'string'},
+        'image_path': _OPTIONAL_STRING
+    }
+})
+
+# The name is only needed on the first capture, when the student is created
+validate_capture_photo = compile_body_schema({
+    'type': 'object',
+    'required': ['student_id'],
+    'properties': dict(_STUDENT_PROPERTIES, name=_OPTIONAL_STRING)
+})
+
+validate_student_ref = compile_body_schema({
+    'type': 'object',
+    'required': ['student_id'],
+    'properties': {'student_id': _REQUIRED_STRING}
+})
@@ -0,0 +1,177 @@
+"""
+Tests for the JSON API: pagination, error mapping, streaming, caching headers
+"""
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+import routes.api
+from database import DatabaseManager
+from models import AttendanceRecord
+from routes.api import (
+    DEFAULT_PAGE_SIZE, INTEGRITY_ERROR_MESSAGES, MAX_PAGE_SIZE, get_pagination_args,
+    violated_unique_column
+)
+
+
+@pytest.mark.parametrize('query, expected', [
+    ('', (1, DEFAULT_PAGE_SIZE, 0, False)),
+    ('page=3&page_size=10', (3, 10, 20, False)),
+    ('limit=25', (1, 25, 0, False)),
+    ('page_size=0', (1, DEFAULT_PAGE_SIZE, 0, False)),
+    ('page_size=-5', (1, 1, 0, False)),
+    (f'page_size={MAX_PAGE_SIZE + 1}', (1, MAX_PAGE_SIZE, 0, False)),
+    ('page=0&include_total=true', (1, DEFAULT_PAGE_SIZE, 0, True)),
+    ('page=x&page_size=y', (1, DEFAULT_PAGE_SIZE, 0, False)),
+])
+def test_pagination_args_are_clamped(app, query, expected):
+    with app.test_request_context(query_string=query):
+        assert get_pagination_args() == expected
+
+
+def test_students_are_paginated(client):
+    for index in range(5):
+        DatabaseManager.create_student(f'S{index}', f'Student {index}')
+
+    body = client.get('/api/students?page=2&page_size=2&include_total=1').get_json()
+
+    assert (body['page'], body['page_size'], body['count'], body['total']) == (2, 2, 2, 5)
+    assert [student['student_id'] for student in body['students']] == ['S2', 'S3']
+
+
+@pytest.mark.parametrize('query, expected', [
+    ('offset=7&page=3&page_size=10', (3, 10, 7, False)),
+    ('offset=-3', (1, DEFAULT_PAGE_SIZE, 0, False)),
+])
+def test_explicit_offset_wins_over_page(app, query, expected):
+    with app.test_request_context(query_string=query):
+        assert get_pagination_args() == expected
+
+
+def five_attendance_records():
+    session = DatabaseManager.create_attendance_session('Lecture')
+    for index in range(5):
+        student = DatabaseManager.create_student(f'S{index}', f'Student {index}')
+        DatabaseManager.mark_attendance(session.id, student.id, 0.9)
+
+
+def failing_after(calls, serialize):
+    """A serializer that raises once it has serialized `calls` rows"""
+    served = []
+
+    def serialize_or_fail(row):
+        if len(served) == calls:
+            raise RuntimeError('connection lost')
+        served.append(row)
+        return serialize(row)
+    return serialize_or_fail
+
+
+def test_attendance_streams_across_batches(client, monkeypatch):
+    monkeypatch.setattr(routes.api, 'STREAM_BATCH_SIZE', 2)
+    five_attendance_records()
+
+    body = client.get('/api/attendance?include_total=1').get_json()
+
+    assert (body['count'], body['total'], len(body['records'])) == (5, 5, 5)
+    assert 'error' not in body
+
+
+def test_stream_failure_after_first_batch_closes_the_document(client, monkeypatch):
+    monkeypatch.setattr(routes.api, 'STREAM_BATCH_SIZE', 2)
+    five_attendance_records()
+    monkeypatch.setattr(AttendanceRecord, 'to_dict', failing_after(2, AttendanceRecord.to_dict))
+
+    response = client.get('/api/attendance')
+
+    # Too late for an error status, but the body is complete JSON that says so
+    assert response.status_code == 200
+    body = response.get_json()
+    assert (body['count'], len(body['records']), body['error']) == (2, 2, 'Internal server error')
+
+
+def test_stream_failure_in_first_batch_is_a_json_500(client, monkeypatch):
+    five_attendance_records()
+    monkeypatch.setattr(AttendanceRecord, 'to_dict', failing_after(0, AttendanceRecord.to_dict))
+
+    response = client.get('/api/attendance')
+
+    assert response.status_code == 500
+    assert response.get_json() == {'success': False, 'error': 'Internal server error'}
+
+
+def test_sessions_stream_across_batches(client, monkeypatch):
+    monkeypatch.setattr(routes.api, 'STREAM_BATCH_SIZE', 2)
+    for index in range(5):
+        DatabaseManager.create_attendance_session(f'Lecture {index}')
+
+    body = client.get('/api/sessions').get_json()
+
+    assert (body['count'], len(body['sessions'])) == (5, 5)
+    assert 'error' not in body
+
+
+def test_duplicate_students_are_client_errors(client):
+    client.post('/api/students', json={'student_id': 'S1', 'name': 'One', 'email': 'one@example.com'})
+
+    response = client.post('/api/students', json={'student_id': 'S1', 'name': 'Again'})
+    assert (response.status_code, response.get_json()['error']) == (400, INTEGRITY_ERROR_MESSAGES['student_id'])
+
+    response = client.post('/api/students', json={'student_id': 'S2', 'name': 'Two', 'email': 'one@example.com'})
+    assert (response.status_code, response.get_json()['error']) == (400, INTEGRITY_ERROR_MESSAGES['email'])
+
+
+@pytest.mark.parametrize('message, column', [
+    ('UNIQUE constraint failed: students.email', 'email'),
+    ('duplicate key value violates unique constraint "students_email_key"', 'email'),
+    ('duplicate key value violates unique constraint "ix_students_student_id"', 'student_id'),
+    ("(1062, \"Duplicate entry 'email' for key 'students.ix_students_student_id'\")", 'student_id'),
+    ("(1062, \"Duplicate entry 'a@b.c' for key 'email'\")", 'email'),
+    ('NOT NULL constraint failed: students.email', None),
+])
+def test_unique_violations_are_matched_on_any_driver(message, column):
+    assert violated_unique_column(IntegrityError('INSERT ...', {}, Exception(message))) == column
+
+
+def revalidate(client, url):
+    """GET `url`, then GET it again with the ETag it returned"""
+    first = client.get(url)
+    return first, client.get(url, headers={'If-None-Match': first.headers['ETag']})
+
+
+@pytest.mark.parametrize('url', ['/api/status', '/api/attendance/stats'])
+def test_polled_endpoints_revalidate(client, url):
+    first, again = revalidate(client, url)
+
+    assert first.status_code == 200 and 'ETag' in first.headers
+    assert (again.status_code, again.data) == (304, b'')
+    assert again.headers['ETag'] == first.headers['ETag']
+    assert 'Cache-Control' in again.headers
+
+
+def test_student_list_etag_follows_table_state(client):
+    DatabaseManager.create_student('S1', 'Student One')
+
+    first, again = revalidate(client, '/api/students')
+    assert (first.status_code, again.status_code) == (200, 304)
+
+    # The same data under a different query is a different representation
+    assert client.get('/api/students?page_size=1').headers['ETag'] != first.headers['ETag']
+
+    DatabaseManager.create_student('S2', 'Student Two')
+    changed = client.get('/api/students', headers={'If-None-Match': first.headers['ETag']})
+    assert changed.status_code == 200
+    assert changed.get_json()['count'] == 2
+
+
+def test_session_list_etag_follows_table_state(client):
+    session = DatabaseManager.create_attendance_session('Lecture')
+
+    first, again = revalidate(client, '/api/sessions')
+    assert (first.status_code, again.status_code) == (200, 304)
+
+    # Attendance changes a session's record count in the list
+    student = DatabaseManager.create_student('S1', 'Student One')
+    DatabaseManager.mark_attendance(session.id, student.id, 0.9)
+    changed = client.get('/api/sessions', headers={'If-None-Match': first.headers['ETag']})
+    assert changed.status_code == 200
+    assert changed.get_json()['sessions'][0]['attendance_count'] == 1
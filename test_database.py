@@ -0,0 +1,137 @@
+"""
+Tests for DatabaseManager's single-statement writes and aggregate queries
+"""
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from database import DatabaseManager
+from models import db, AttendanceRecord, FaceEncoding
+
+
+def started_session(minutes_ago=0):
+    """An active session whose start_time is `minutes_ago` in the past"""
+    session = DatabaseManager.create_attendance_session('Lecture')
+    session.start_time = datetime.utcnow() - timedelta(minutes=minutes_ago)
+    db.session.commit()
+    return session
+
+
+def test_mark_attendance_skips_repeats_within_cooldown(app):
+    student = DatabaseManager.create_student('S1', 'Student One')
+    session = started_session()
+
+    first = DatabaseManager.mark_attendance(session.id, student.id, 0.9, cooldown_minutes=5)
+    assert first is not None
+    assert (first.session_id, first.student_id, first.status) == (session.id, student.id, 'present')
+    assert DatabaseManager.mark_attendance(session.id, student.id, 0.9, cooldown_minutes=5) is None
+
+    # Past the cooldown the student can be marked again
+    first.timestamp = datetime.utcnow() - timedelta(minutes=6)
+    db.session.commit()
+    assert DatabaseManager.mark_attendance(session.id, student.id, 0.9, cooldown_minutes=5) is not None
+
+    # The cooldown is per session
+    other = started_session()
+    assert DatabaseManager.mark_attendance(other.id, student.id, 0.9, cooldown_minutes=5) is not None
+    assert AttendanceRecord.query.count() == 3
+
+
+def test_mark_attendance_sets_late_after_threshold(app):
+    student = DatabaseManager.create_student('S1', 'Student One')
+    on_time = started_session(minutes_ago=10)
+    late = started_session(minutes_ago=45)
+
+    assert DatabaseManager.mark_attendance(on_time.id, student.id, 0.9).status == 'present'
+    assert DatabaseManager.mark_attendance(late.id, student.id, 0.9).status == 'late'
+
+    # Explicit statuses are kept as given
+    excused = started_session(minutes_ago=45)
+    assert DatabaseManager.mark_attendance(excused.id, student.id, 0.9, status='excused').status == 'excused'
+
+    # The threshold comes from the late_threshold_minutes setting
+    DatabaseManager.set_config('late_threshold_minutes', '60')
+    relaxed = started_session(minutes_ago=45)
+    assert DatabaseManager.mark_attendance(relaxed.id, student.id, 0.9).status == 'present'
+
+
+def test_mark_attendance_by_student_id_resolves_in_the_insert(app):
+    student = DatabaseManager.create_student('S1', 'Student One')
+    session = started_session()
+
+    record = DatabaseManager.mark_attendance_by_student_id(session.id, 'S1', 0.8, image_path='a.jpg')
+    assert (record.student_id, record.image_path) == (student.id, 'a.jpg')
+    assert DatabaseManager.mark_attendance_by_student_id(session.id, 'missing', 0.8) is None
+
+
+def test_add_face_encoding_resolves_the_student_in_the_insert(app):
+    student = DatabaseManager.create_student('S1', 'Student One')
+    embedding = np.random.rand(512).astype(np.float32)
+
+    face_encoding = DatabaseManager.add_face_encoding('S1', embedding, 0.8, 'S1/photo.jpg')
+    assert (face_encoding.student_id, face_encoding.quality_score) == (student.id, 0.8)
+    assert face_encoding.image_path == 'S1/photo.jpg' and face_encoding.is_active
+
+    names, student_ids, matrix = DatabaseManager.get_face_encoding_matrix()
+    assert (names, student_ids) == (['Student One'], [student.id])
+    np.testing.assert_array_equal(matrix[0], embedding)
+
+    assert DatabaseManager.add_face_encoding('missing', embedding) is None
+    assert FaceEncoding.query.count() == 1
+
+
+def test_add_face_encodings_inserts_the_batch(app):
+    student = DatabaseManager.create_student('S1', 'Student One')
+    captured_at = datetime(2024, 1, 1, 9, 0)
+    batch = [(np.random.rand(512).astype(np.float32), quality, f'S1/{index}.jpg', captured_at)
+             for index, quality in enumerate((0.6, 0.8, 1.0))]
+
+    assert DatabaseManager.add_face_encodings(student.id, []) == 0
+    assert DatabaseManager.add_face_encodings(student.id, batch) == 3
+
+    rows = FaceEncoding.query.filter_by(student_id=student.id).order_by(FaceEncoding.id).all()
+    assert [row.image_path for row in rows] == ['S1/0.jpg', 'S1/1.jpg', 'S1/2.jpg']
+    assert {row.created_at for row in rows} == {captured_at}
+    count, mean_quality, min_quality = DatabaseManager.get_face_encoding_quality(student.id)
+    assert (count, round(mean_quality, 6), min_quality) == (3, 0.8, 0.6)
+
+
+def test_attendance_stats_in_one_query(app):
+    students = [DatabaseManager.create_student(f'S{index}', f'Student {index}') for index in range(5)]
+    DatabaseManager.update_student('S4', status='inactive')
+    session = started_session()
+    for student, status in zip(students, ('present', 'late', 'excused')):
+        DatabaseManager.mark_attendance(session.id, student.id, 0.9, status=status)
+    other = started_session()
+    DatabaseManager.mark_attendance(other.id, students[0].id, 0.9)
+
+    # Absent counts active students without a record in the session
+    assert DatabaseManager.get_attendance_stats(session.id) == {
+        'total': 3, 'present': 1, 'late': 1, 'absent': 1
+    }
+    assert DatabaseManager.get_attendance_stats() == {
+        'total': 4, 'present': 2, 'late': 1, 'absent': 0
+    }
+
+
+def test_set_configs_upserts_all_keys(app):
+    DatabaseManager.set_config('late_threshold_minutes', '30', 'Minutes before marking late')
+    assert DatabaseManager.get_config('late_threshold_minutes') == '30'  # Now cached
+
+    DatabaseManager.set_configs(
+        {'late_threshold_minutes': '15', 'attendance_cooldown_minutes': '10'},
+        {'attendance_cooldown_minutes': 'Minutes between marks'}
+    )
+
+    assert DatabaseManager.get_settings() == {
+        'late_threshold_minutes': '15', 'attendance_cooldown_minutes': '10'
+    }
+    descriptions = {config.key: config.description for config in DatabaseManager.get_all_configs()}
+    # Keys without a new description keep their old one
+    assert descriptions == {
+        'late_threshold_minutes': 'Minutes before marking late',
+        'attendance_cooldown_minutes': 'Minutes between marks'
+    }
+
+    DatabaseManager.set_configs({})
+    assert len(DatabaseManager.get_all_configs()) == 2
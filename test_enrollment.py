@@ -0,0 +1,75 @@
+"""
+Tests for buffered enrollment encodings (flushed on complete and stop)
+"""
+import time
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+import routes.api as api
+from database import DatabaseManager
+
+
+def buffer_photos(student_id, count):
+    """Start an enrollment for a new student with `count` captured, unsaved encodings"""
+    student = DatabaseManager.create_student(student_id, f'Student {student_id}')
+    api.enrollments()[student_id] = {
+        'student_db_id': student.id,
+        'name': student.name,
+        'dir': None,
+        'saved_encodings': 0,
+        'expires': time.monotonic() + api.ENROLLMENT_TTL,
+    }
+    api.pending_encodings()[student.id] = [
+        (np.random.rand(512).astype(np.float32), 0.9, None, datetime.utcnow())
+        for _ in range(count)
+    ]
+    return student.id
+
+
+def test_complete_saves_buffered_encodings(client):
+    student_db_id = buffer_photos('E1', 3)
+
+    response = client.post('/api/enrollment/complete', json={'student_id': 'E1'})
+
+    assert response.status_code == 200
+    assert response.get_json()['encoding_count'] == 3
+    assert response.get_json()['quality'] == {'mean': pytest.approx(0.9), 'min': pytest.approx(0.9)}
+    assert DatabaseManager.count_face_encodings(student_db_id) == 3
+    assert student_db_id not in api.pending_encodings()
+    assert 'E1' not in api.enrollments()
+
+
+def test_stop_saves_only_the_callers_encodings(client):
+    first_db_id = buffer_photos('E1', 2)
+    second_db_id = buffer_photos('E2', 1)
+
+    client.post('/api/enrollment/stop', json={'student_id': 'E1'})
+
+    assert DatabaseManager.count_face_encodings(first_db_id) == 2
+    assert 'E1' not in api.enrollments()
+    assert DatabaseManager.count_face_encodings(second_db_id) == 0
+    assert len(api.pending_encodings()[second_db_id]) == 1
+    assert 'E2' in api.enrollments()
+
+
+def test_failed_insert_keeps_the_buffer(client, monkeypatch):
+    student_db_id = buffer_photos('E1', 3)
+    add_face_encodings = DatabaseManager.add_face_encodings
+
+    def failing_insert(db_id, encodings):
+        raise RuntimeError('database unavailable')
+
+    monkeypatch.setattr(DatabaseManager, 'add_face_encodings', failing_insert)
+    response = client.post('/api/enrollment/complete', json={'student_id': 'E1'})
+
+    assert response.status_code == 500
+    assert len(api.pending_encodings()[student_db_id]) == 3
+    assert 'E1' in api.enrollments()
+
+    monkeypatch.setattr(DatabaseManager, 'add_face_encodings', add_face_encodings)
+    response = client.post('/api/enrollment/complete', json={'student_id': 'E1'})
+
+    assert response.status_code == 200
+    assert DatabaseManager.count_face_encodings(student_db_id) == 3
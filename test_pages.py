@@ -0,0 +1,40 @@
+"""
+Tests for the HTML pages: dashboard caching and page ETags
+"""
+import pytest
+
+from database import DatabaseManager
+
+
+def test_dashboard_shows_writes_made_outside_the_api(client):
+    assert b'Inactive' in client.get('/').data
+
+    # As the recognition thread does: straight through DatabaseManager
+    student = DatabaseManager.create_student('S1', 'Student One')
+    session = DatabaseManager.create_attendance_session('Morning Lecture')
+    assert b'Morning Lecture' in client.get('/').data
+
+    DatabaseManager.mark_attendance(session.id, student.id, confidence_score=0.9)
+    assert b'<strong>Attendance Count:</strong> 1' in client.get('/').data
+
+    DatabaseManager.end_session(session.id)
+    assert b'Inactive' in client.get('/').data
+
+
+@pytest.mark.parametrize('url, write', [
+    ('/students', lambda: DatabaseManager.create_student('S2', 'Student Two')),
+    ('/sessions', lambda: DatabaseManager.create_attendance_session('Evening Lecture')),
+])
+def test_pages_revalidate_until_their_data_changes(client, url, write):
+    DatabaseManager.create_student('S1', 'Student One')
+    DatabaseManager.create_attendance_session('Morning Lecture')
+
+    first = client.get(url)
+    etag = first.headers['ETag']
+    again = client.get(url, headers={'If-None-Match': etag})
+    assert (first.status_code, again.status_code, again.data) == (200, 304, b'')
+
+    write()
+    changed = client.get(url, headers={'If-None-Match': etag})
+    assert changed.status_code == 200
+    assert changed.headers['ETag'] != etag
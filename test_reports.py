@@ -0,0 +1,73 @@
+"""
+Tests for end-of-session reports sent from the background report worker
+"""
+import threading
+
+import routes.api as api
+from database import DatabaseManager
+
+
+def ended_with_attendance(client, instructor_email='instructor@example.com'):
+    """End a session with one attendance record; returns the end_session response"""
+    session = DatabaseManager.create_attendance_session('Lecture', instructor_email=instructor_email)
+    student = DatabaseManager.create_student('S1', 'Student One')
+    DatabaseManager.mark_attendance(session.id, student.id, 0.9)
+    return session.id, client.post(f'/api/sessions/{session.id}/end')
+
+
+def test_end_session_queues_the_report(client, monkeypatch):
+    release = threading.Event()
+    sent_to = []
+
+    def slow_report(session_data, attendance_records):
+        release.wait(5)
+        return {'excel_bytes': b'xlsx', 'excel_filename': 'report.xlsx',
+                'spreadsheet_url': 'https://sheets.example/1'}
+
+    def send_email(recipient_email, **kwargs):
+        sent_to.append(recipient_email)
+        return True
+
+    monkeypatch.setattr(api, 'create_attendance_report', slow_report)
+    monkeypatch.setattr(api, 'send_attendance_report_email', send_email)
+
+    session_id, response = ended_with_attendance(client)
+    assert response.status_code == 202
+    job_id = response.get_json()['report_job_id']
+    status_url = f'/api/sessions/{session_id}/report-status/{job_id}'
+    assert client.get(status_url).get_json()['status'] == 'running'
+
+    release.set()
+    api.report_jobs()[job_id][1].result(timeout=5)
+
+    body = client.get(status_url).get_json()
+    assert (body['status'], body['report_sent']) == ('finished', True)
+    assert body['report_info'] == {
+        'spreadsheet_url': 'https://sheets.example/1', 'recipient': 'instructor@example.com'
+    }
+    assert sent_to == ['instructor@example.com']
+    assert client.get(f'/api/sessions/{session_id + 1}/report-status/{job_id}').status_code == 404
+
+
+def test_report_failure_is_reported_by_status(client, monkeypatch):
+    def failing_report(session_data, attendance_records):
+        raise RuntimeError('Sheets quota exceeded')
+
+    monkeypatch.setattr(api, 'create_attendance_report', failing_report)
+
+    session_id, response = ended_with_attendance(client)
+    job_id = response.get_json()['report_job_id']
+    api.report_jobs()[job_id][1].result(timeout=5)
+
+    body = client.get(f'/api/sessions/{session_id}/report-status/{job_id}').get_json()
+    assert (body['status'], body['report_sent'], body['report_error']) == (
+        'finished', False, 'Sheets quota exceeded'
+    )
+
+
+def test_end_session_without_instructor_email_queues_nothing(client):
+    _, response = ended_with_attendance(client, instructor_email=None)
+
+    assert response.status_code == 200
+    assert response.get_json()['report_sent'] is False
+    assert 'report_job_id' not in response.get_json()
@@ -2,62 +2,91 @@
 """
 Quick test script for the web interface
 """
+from concurrent.futures import ThreadPoolExecutor
 import requests
 
 BASE_URL = "http://localhost:5000"
 
-def test_endpoints():
-    """Test various endpoints"""
-
-    print("Testing Face Attendance System Web Interface")
-    print("=" * 50)
 
-    # Test health endpoint
+def check_health(session):
+    """Test health endpoint"""
+    lines = []
     try:
-        response = requests.get(f"{BASE_URL}/api/health", timeout=5)
-        print(f"✓ Health Check: {response.status_code}")
+        response = session.get(f"{BASE_URL}/api/health", timeout=5)
+        lines.append(f"✓ Health Check: {response.status_code}")
         if response.status_code == 200:
-            print(f"  Response: {response.json()}")
+            lines.append(f"  Response: {response.json()}")
     except Exception as e:
-        print(f"✗ Health Check Failed: {e}")
+        lines.append(f"✗ Health Check Failed: {e}")
+    return lines
 
-    # Test home page
+
+def check_home_page(session):
+    """Test home page"""
     try:
-        response = requests.get(BASE_URL, timeout=5)
-        print(f"✓ Home Page: {response.status_code}")
+        response = session.get(BASE_URL, timeout=5)
+        return [f"✓ Home Page: {response.status_code}"]
     except Exception as e:
-        print(f"✗ Home Page Failed: {e}")
+        return [f"✗ Home Page Failed: {e}"]
+
 
-    # Test live recognition page
+def check_live_page(session):
+    """Test live recognition page"""
     try:
-        response = requests.get(f"{BASE_URL}/live", timeout=5)
-        print(f"✓ Live Recognition Page: {response.status_code}")
+        response = session.get(f"{BASE_URL}/live", timeout=5)
+        return [f"✓ Live Recognition Page: {response.status_code}"]
     except Exception as e:
-        print(f"✗ Live Recognition Page Failed: {e}")
+        return [f"✗ Live Recognition Page Failed: {e}"]
+
 
-    # Test recognition status
+def check_recognition_status(session):
+    """Test recognition status"""
+    lines = []
     try:
-        response = requests.get(f"{BASE_URL}/api/recognition/status", timeout=5)
-        print(f"✓ Recognition Status: {response.status_code}")
+        response = session.get(f"{BASE_URL}/api/recognition/status", timeout=5)
+        lines.append(f"✓ Recognition Status: {response.status_code}")
         if response.status_code == 200:
             data = response.json()
             if data.get('success'):
-                print(f"  Status: {data.get('status')}")
+                lines.append(f"  Status: {data.get('status')}")
     except Exception as e:
-        print(f"✗ Recognition Status Failed: {e}")
+        lines.append(f"✗ Recognition Status Failed: {e}")
+    return lines
 
-    # Test active session
+
+def check_active_session(session):
+    """Test active session"""
+    lines = []
     try:
-        response = requests.get(f"{BASE_URL}/api/sessions/active", timeout=5)
-        print(f"✓ Active Session Check: {response.status_code}")
+        response = session.get(f"{BASE_URL}/api/sessions/active", timeout=5)
+        lines.append(f"✓ Active Session Check: {response.status_code}")
         if response.status_code == 200:
             data = response.json()
             if data.get('success'):
-                print(f"  Active Session: {data.get('session', {}).get('session_name')}")
+                lines.append(f"  Active Session: {data.get('session', {}).get('session_name')}")
         elif response.status_code == 404:
-            print("  No active session found (expected if none created)")
+            lines.append("  No active session found (expected if none created)")
     except Exception as e:
-        print(f"✗ Active Session Check Failed: {e}")
+        lines.append(f"✗ Active Session Check Failed: {e}")
+    return lines
+
+
+CHECKS = [check_health, check_home_page, check_live_page,
+          check_recognition_status, check_active_session]
+
+
+def test_endpoints():
+    """Test various endpoints"""
+
+    print("Testing Face Attendance System Web Interface")
+    print("=" * 50)
+
+    # Checks run concurrently (total time is the slowest one, not the sum)
+    # over a shared keep-alive pool; results print in the order above
+    with requests.Session() as session, ThreadPoolExecutor(max_workers=len(CHECKS)) as pool:
+        for lines in pool.map(lambda check: check(session), CHECKS):
+            for line in lines:
+                print(line)
 
     print("\n" + "=" * 50)
     print("Testing complete!")
@@ -1,16 +1,117 @@
 """
 Utility functions for the Flask application
 """
+import decimal
+import hashlib
 import pytz
 from datetime import datetime
-from flask import current_app
+from functools import lru_cache
+from flask import current_app, request
+from flask.json.provider import JSONProvider
 
-def convert_utc_to_local(utc_datetime):
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    from ciso8601 import parse_datetime  # Optional: C ISO 8601 parser
+except ImportError:
+    parse_datetime = datetime.fromisoformat
+
+
+def _orjson_default(obj):
+    """Fallback serializer for types orjson does not handle natively"""
+    if isinstance(obj, decimal.Decimal):
+        return str(obj)
+    if hasattr(obj, '__html__'):
+        return str(obj.__html__())
+    raise TypeError(f'Object of type {type(obj).__name__} is not JSON serializable')
+
+
+class ORJSONProvider(JSONProvider):
+    """
+    Flask JSON provider backed by orjson
+
+    orjson encodes in native code and handles datetimes and numpy values
+    (e.g. recognition distances) directly. Install it on the app with
+    app.json = ORJSONProvider(app); only used when orjson is importable.
+    """
+
+    option = orjson.OPT_NAIVE_UTC | orjson.OPT_SERIALIZE_NUMPY if orjson else 0
+
+    def dumps(self, obj, **kwargs):
+        return self.dumpb(obj).decode()
+
+    def dumpb(self, obj):
+        """Serialize to UTF-8 JSON bytes, as orjson produces them"""
+        return orjson.dumps(obj, default=_orjson_default, option=self.option)
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        """Build jsonify() responses straight from orjson's bytes (no str round trip)"""
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(self.dumpb(obj), mimetype='application/json')
+
+
+def json_bytes(obj):
+    """Serialize obj with the app's JSON provider, as UTF-8 bytes"""
+    provider = current_app.json
+    if isinstance(provider, ORJSONProvider):
+        return provider.dumpb(obj)
+    return provider.dumps(obj).encode()
+
+
+def content_etag(body):
+    """Short content hash of a serialized response body (bytes)"""
+    return hashlib.blake2b(body, digest_size=8).hexdigest()
+
+
+def not_modified(etag, max_age=None):
+    """
+    Empty 304 carrying `etag` if the client already has it, else None
+
+    ETags are weak: they identify the data, not the exact bytes, so they
+    still match when the body is served compressed.
+    """
+    if not request.if_none_match.contains_weak(etag):
+        return None
+    return cache_headers(current_app.response_class(status=304), etag, max_age)
+
+
+def cache_headers(response, etag, max_age=None):
+    """Set the ETag and Cache-Control (no-cache when max_age is None)"""
+    response.set_etag(etag, weak=True)
+    if max_age is None:
+        response.cache_control.no_cache = True
+    else:
+        response.cache_control.max_age = max_age
+    return response
+
+
+_UTC = pytz.utc
+
+
+@lru_cache(maxsize=8)
+def _get_tz(tz_name):
+    """pytz timezone by name, built once per name"""
+    return pytz.timezone(tz_name)
+
+
+def get_local_timezone(app=None):
+    """Timezone configured for the app (TIMEZONE), as a pytz timezone"""
+    return _get_tz((app or current_app).config.get('TIMEZONE', 'UTC'))
+
+
+def convert_utc_to_local(utc_datetime, tz=None):
     """
     Convert UTC datetime to local timezone
     
     Args:
         utc_datetime: datetime object (assumed to be UTC if no timezone)
+        tz: Target timezone; defaults to the current app's (get_local_timezone())
     
     Returns:
         datetime object in local timezone
@@ -18,13 +119,26 @@ def convert_utc_to_local(utc_datetime):
     if utc_datetime is None:
         return None
     
-    # If datetime has no timezone info, assume it's UTC
+    # If datetime has no timezone info, assume it's UTC (no DST, so no localize())
     if utc_datetime.tzinfo is None:
-        utc_datetime = pytz.utc.localize(utc_datetime)
-    
-    # Get configured timezone
-    tz_name = current_app.config.get('TIMEZONE', 'UTC')
-    tz = pytz.timezone(tz_name)
+        utc_datetime = utc_datetime.replace(tzinfo=_UTC)
     
     # Convert to local timezone
-    return utc_datetime.astimezone(tz)
\ No newline at end of file
+    return utc_datetime.astimezone(tz or get_local_timezone())
+
+
+def convert_many_utc_to_local(utc_datetimes):
+    """
+    Convert a list of UTC datetimes to local timezone
+
+    Same as convert_utc_to_local per item, but reads the configured
+    timezone once for the whole list (e.g. every row of a page).
+
+    Returns:
+        List of local datetimes (None where the input is None)
+    """
+    tz = get_local_timezone()
+    return [
+        None if dt is None else (dt.replace(tzinfo=_UTC) if dt.tzinfo is None else dt).astimezone(tz)
+        for dt in utc_datetimes
+    ]